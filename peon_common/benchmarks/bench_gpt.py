@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""GPT request path load test against local OpenAI/Rasa stand-ins.
+
+Drives `Completion.request` (worker threads), `Completion.arequest` across
+several owners (fair scheduler), discord `cmd_gpt` and telegram direct chat
+handlers, reporting throughput and latency percentiles along with stand-in
+accounting. Chat history is kept in memory unless `--db` is given (database
+connection is then configured by the usual environment variables).
+
+Usage (from peon_common folder): python benchmarks/bench_gpt.py [--requests 200]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import openai
+
+from peon_common import gpt
+from peon_common.db import initialize_db
+from peon_common.scheduler import MAX_CONCURRENT, FairScheduler
+from peon_common.standins import OpenAIStandIn, RasaStandIn, serve
+from peon_common.utils import APP_NAME, ENV_TOKEN_OPENAI
+
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+CLIENT_PATHS = [REPO_DIR / "peon_discord", REPO_DIR / "peon_telegram"]
+
+PROMPTS = [
+    "how do i get to stormwind",
+    "what's the weather like in tallinn today",
+    "tell me a joke about orcs",
+    "price of arcanite bar?",
+    "hello peon",
+    "explain step by step how to farm gold in stranglethorn vale",
+]
+
+WEATHER = "Tallinn: 12°C, light rain"
+"""Canned weather intent data."""
+
+
+class MemoryHistory:
+    """In-memory replacement of `GPTChatHistory` (used without `--db`)."""
+
+    interactions = {}
+
+    @classmethod
+    def store(cls, owner_id, user, system, timestamp=None):
+        cls.interactions.setdefault(owner_id, []).append((user, system))
+
+    @classmethod
+    def fetch_with_summary(cls, owner_id, after_ts=None):
+        return None, [
+            message
+            for user, system in cls.interactions.get(owner_id, [])[-10:]
+            for message in (
+                gpt.Completion.message(gpt.MESSAGE_ROLE_USER, user),
+                gpt.Completion.message(gpt.MESSAGE_ROLE_ASSISTANT, system),
+            )
+        ]
+
+
+class FakeMessage:
+    """Posted chat message recording edits (discord and telegram flavours).
+
+    Timestamps in `edits` (and discord reactions) measure first feedback.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.edits = []
+
+    async def edit(self, content=None, **kwargs):
+        self.edits.append(time.monotonic())
+        self.text = content
+
+    async def edit_text(self, text, **kwargs):
+        await self.edit(content=text)
+
+
+def report(label, latencies, elapsed, feedback=None):
+    """Print throughput and latency percentiles (`None` latency is a failure)."""
+
+    total, failed = len(latencies), latencies.count(None)
+    latencies = np.array([latency for latency in latencies if latency is not None])
+    p50, p95, p99 = (
+        np.percentile(latencies, [50, 95, 99]) if total > failed else [0] * 3
+    )
+    line = (
+        f"{label:<28}{len(latencies) / elapsed:>8.1f} req/s"
+        f"  p50 {p50:6.3f}s  p95 {p95:6.3f}s  p99 {p99:6.3f}s  failed {failed}"
+    )
+    if feedback:
+        line += f"  1st feedback p50 {np.percentile(feedback, 50):6.3f}s"
+    print(line)
+
+
+def prompt(i):
+    return f"{PROMPTS[i % len(PROMPTS)]} #{i}"
+
+
+def bench_request(count, concurrency):
+    def call(i):
+        start = time.monotonic()
+        try:
+            gpt.Completion().request(prompt(i), handle_intents=True)
+        except openai.error.OpenAIError:
+            return None
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(call, range(count)))
+    report("request (threads)", latencies, time.monotonic() - start)
+
+
+async def bench_arequest(count, owners):
+    async def call(i):
+        start = time.monotonic()
+        try:
+            await gpt.Completion().arequest(
+                prompt(i), owner_id=f"owner{i % owners}", use_history=True
+            )
+        except openai.error.OpenAIError:
+            return None
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    latencies = await asyncio.gather(*map(call, range(count)))
+    report(f"arequest ({owners} owners)", latencies, time.monotonic() - start)
+
+
+async def bench_discord(count, owners):
+    from discord.enums import ChannelType
+    from peon_discord import commands
+
+    bot = SimpleNamespace(client=SimpleNamespace(user=SimpleNamespace(id=1)))
+    feedback = []
+
+    async def call(i):
+        placeholder = FakeMessage(None)
+
+        async def send(text, **kwargs):
+            placeholder.text = text
+            return placeholder
+
+        async def add_reaction(emoji):
+            placeholder.edits.append(time.monotonic())
+
+        async def remove_reaction(emoji, member):
+            pass
+
+        message = SimpleNamespace(
+            content=f"{commands.mention_format(1)} {prompt(i)}",
+            author=SimpleNamespace(id=i % owners),
+            channel=SimpleNamespace(type=ChannelType.private, send=send),
+            add_reaction=add_reaction,
+            remove_reaction=remove_reaction,
+        )
+        start = time.monotonic()
+        await commands.cmd_gpt(message, message.content, client=bot)
+        feedback.append(placeholder.edits[0] - start)
+        if placeholder.text == "something went wrong ;(":
+            return None
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):  # cmd_gpt debug prints
+        latencies = await asyncio.gather(*map(call, range(count)))
+    report("discord cmd_gpt", latencies, time.monotonic() - start, feedback)
+
+
+async def bench_telegram(count, owners):
+    from peon_telegram import handlers
+
+    direct_chat = next(
+        handler.callback
+        for handler in handlers.HANDLERS
+        if handler.callback.__name__ == "direct_chat"
+    )
+    feedback = []
+
+    async def call(i):
+        placeholder = FakeMessage(None)
+
+        async def send_message(chat_id, text, **kwargs):
+            return placeholder if placeholder.text is None else FakeMessage(text)
+
+        user = SimpleNamespace(id=i % owners, name=f"user{i % owners}")
+        update = SimpleNamespace(
+            message=SimpleNamespace(text=prompt(i), id=i, from_user=user),
+            effective_user=user,
+            effective_chat=SimpleNamespace(id=i % owners),
+        )
+        context = SimpleNamespace(bot=SimpleNamespace(send_message=send_message))
+        start = time.monotonic()
+        try:
+            await direct_chat(update, context)
+        except openai.error.OpenAIError:
+            return None
+        finally:
+            if placeholder.edits:
+                feedback.append(placeholder.edits[0] - start)
+        return time.monotonic() - start
+
+    start = time.monotonic()
+    latencies = await asyncio.gather(*map(call, range(count)))
+    report("telegram direct chat", latencies, time.monotonic() - start, feedback)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--owners", type=int, default=8)
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db", action="store_true", help="store history in MongoDB")
+    args = parser.parse_args()
+
+    sys.path[:0] = [str(path) for path in CLIENT_PATHS]
+    import peon_discord.commands, peon_telegram.handlers  # noqa: E401,F401
+
+    logging.getLogger(APP_NAME).setLevel(logging.WARNING)
+
+    openai_standin = OpenAIStandIn(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        seed=1,
+    )
+    rasa_standin = RasaStandIn(seed=1)
+
+    with (
+        serve(openai_standin.app()) as openai_url,
+        serve(rasa_standin.app()) as rasa_url,
+        mock.patch.object(openai, "api_base", str(openai_url / "v1")),
+        mock.patch.object(
+            gpt.Completion, "SCHEDULER", FairScheduler(args.max_concurrent)
+        ),
+        mock.patch.dict(
+            os.environ,
+            {ENV_TOKEN_OPENAI: "stand-in", gpt.RASA_PROVIDER_URL_ENV: str(rasa_url)},
+        ),
+        # intent handler would query real geocoding/weather services
+        mock.patch.object(gpt.IntentManager, "query_weather", return_value=WEATHER),
+    ):
+        if args.db:
+            initialize_db()
+        else:
+            mock.patch("peon_common.gpt.GPTChatHistory", MemoryHistory).start()
+            for owner in range(args.owners):
+                for owner_id in (f"owner{owner}", str(owner)):
+                    gpt.Completion.ROLES.set(owner_id, None)
+                    gpt.Completion.MODEL_OVERRIDES.set(owner_id, None)
+
+        print(
+            f"{args.requests} requests, stand-in latency {args.latency}s"
+            f" + {args.reply_tokens} x {args.token_delay}s per token"
+        )
+        bench_request(args.requests, args.concurrency)
+        asyncio.run(bench_arequest(args.requests, args.owners))
+        asyncio.run(bench_discord(args.requests, args.owners))
+        asyncio.run(bench_telegram(args.requests, args.owners))
+
+    print(f"openai stand-in: {openai_standin.stats.as_dict()}")
+    print(f"models:          {dict(openai_standin.models)}")
+    print(f"rasa stand-in:   {rasa_standin.stats.as_dict()}")
+
+
+if __name__ == "__main__":
+    run()
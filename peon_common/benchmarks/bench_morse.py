@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Morse codec benchmark over multi-kilobyte payloads: legacy scans vs lookup codec.
+
+Usage (from peon_common folder): python benchmarks/bench_morse.py
+"""
+
+import random
+
+from corpus import bench
+from peon_common import functions
+from peon_common.morse import MORSE, MORSE_CODE
+
+
+def legacy_is_morse(text):
+    chars = {}
+    for char in text:
+        chars[char] = chars[char] + 1 if char in chars else 1
+        if char not in [".", "-", " "] or len(chars) > 3:
+            return False
+    return True
+
+
+def legacy_from_morse(text):
+    words = text.split("  ") if "  " in text else [text]
+    words_translated = []
+    morse_map = MORSE_CODE.items()
+    for word in (w.strip() for w in words):
+        if word:
+            words_translated.append(
+                "".join(
+                    next((k for k, v in morse_map if v == char), "")
+                    for char in word.split()
+                )
+            )
+    return " ".join(words_translated)
+
+
+def legacy_to_morse(text):
+    return " ".join(MORSE_CODE[_] for _ in text)
+
+
+def payload(size, seed=7):
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+    words = []
+    while sum(map(len, words)) < size:
+        words.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9))))
+    return " ".join(words)[:size].strip()
+
+
+def run():
+    for size in (1024, 8192, 65536):
+        text = payload(size)
+        code = legacy_to_morse(text)
+        assert functions.to_morse(text) == code
+        assert functions.from_morse(code) == legacy_from_morse(code)
+        print(f"payload: {len(text)} chars of text, {len(code)} chars of morse")
+
+        bench("encode (legacy)", lambda: legacy_to_morse(text))
+        bench("encode (codec)", lambda: functions.to_morse(text))
+        bench("detect (legacy)", lambda: legacy_is_morse(code))
+        bench("detect (codec)", lambda: functions.is_morse(code))
+        bench("decode (legacy)", lambda: legacy_from_morse(code))
+        bench("decode (codec)", lambda: functions.from_morse(code))
+        chunks = [code[i : i + 256] for i in range(0, len(code), 256)]
+        bench("decode (codec, 256-char stream)", lambda: "".join(MORSE.decode(chunks)))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""starify benchmark: legacy string concatenation vs buffer-based renderer.
+
+Usage (from peon_common folder): python benchmarks/bench_starify.py
+"""
+
+import random
+
+from corpus import bench
+from peon_common import functions
+
+
+def legacy_starify(sentence, limit=600):
+    alphabet = " " * 50 + "★★●°°☾☆¸¸¸,..:'"
+    excluded = " "
+    words = sentence.split(" ")
+
+    for i in range(len(words)):
+        if i == 0:
+            words[i] = f" {words[i]}.. "
+        elif i == len(words) - 1:
+            words[i] = f" ...{words[i]} "
+        else:
+            words[i] = f" ..{words[i]}.. "
+
+    limit = limit - sum([len(w) for w in words])
+    payload = words
+    points = [int(limit * (i + 1) / (len(payload) + 1)) for i in range(len(payload))]
+    payload = list(zip(points, payload))
+    sky = ""
+    last_char = None
+
+    for _ in range(limit):
+        if len(sky) in points:
+            sky += next(word for point, word in payload if point == len(sky))
+        if last_char is None or last_char in excluded:
+            last_char = random.choice(alphabet)
+        else:
+            last_char = random.choice(alphabet.replace(last_char, ""))
+        sky += last_char
+
+    return sky
+
+
+def run():
+    sentence = "every sixty seconds in africa a minute passes " * 3
+    for limit in (600, 2000, 4096):
+        print(f"limit: {limit}")
+        bench("  legacy", lambda: legacy_starify(sentence, limit), number=20)
+        bench("  buffer", lambda: functions.starify(sentence, limit), number=20)
+        bench("  buffer (seeded, cached)", lambda: functions.starify(sentence, limit, seed=1), number=20)
+
+
+if __name__ == "__main__":
+    run()
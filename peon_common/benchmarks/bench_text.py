@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Text transformation benchmark: legacy per-call implementations vs compiled ones.
+
+Usage (from peon_common folder): python benchmarks/bench_text.py
+"""
+
+import re
+
+from corpus import bench, chat_corpus
+from peon_common import functions
+
+
+def legacy_de_latinize(text):
+    chars = {
+        "e": "е", "t": "т", "y": "у", "o": "о", "p": "р", "a": "а",
+        "h": "н", "k": "к", "x": "х", "c": "с", "b": "в", "m": "м",
+    }  # fmt: skip
+    for k, v in chars.items():
+        text = text.replace(k, v)
+    return text
+
+
+def legacy_normalize_text(text, simple_mask=False, do_de_latinize=False):
+    if simple_mask:
+        text = re.sub(
+            r"\^|\$|!|#|%|^|&|€|£|¢|¥|§|<|>|\?|~|\*|,|[0-9]|:|;|\[|\]|=|-|\+|_",
+            "",
+            text.lower(),
+        ).replace("ё", "е")
+    if do_de_latinize:
+        text = legacy_de_latinize(text)
+    return text
+
+
+def legacy_punto(text):
+    keys = set(text)
+    latin_count = len([char for char in keys if char in functions.punto_map])
+    cyrillic_count = len(
+        [char for char in keys if char in functions.punto_map_reversed]
+    )
+    use_map = (
+        functions.punto_map
+        if latin_count >= cyrillic_count
+        else functions.punto_map_reversed
+    )
+    return "".join(use_map.get(char, char) for char in text)
+
+
+def legacy_translitify(text):
+    return "".join([functions.translit_map.get(char) or char for char in text])
+
+
+def run(corpus):
+    print(f"corpus: {len(corpus)} messages, {sum(map(len, corpus))} chars")
+    cases = [
+        (
+            "normalize (simple_mask + de_latinize)",
+            lambda t: legacy_normalize_text(t, simple_mask=True, do_de_latinize=True),
+            lambda t: functions.normalize_text(t, simple_mask=True, do_de_latinize=True),
+        ),
+        ("de_latinize", legacy_de_latinize, functions.de_latinize),
+        ("punto", legacy_punto, functions.punto),
+        ("translitify", legacy_translitify, functions.translitify),
+    ]
+
+    for label, legacy, compiled in cases:
+        assert [legacy(t) for t in corpus] == [compiled(t) for t in corpus], label
+        old = bench(f"{label} (legacy)", lambda: [legacy(t) for t in corpus])
+        new = bench(f"{label} (compiled)", lambda: [compiled(t) for t in corpus])
+        print(f"{'':<48} x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    run(chat_corpus())
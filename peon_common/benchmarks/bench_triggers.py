@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Simple reply trigger matching: per-trigger substring scan vs Aho-Corasick automaton.
+
+Usage (from peon_common folder): python benchmarks/bench_triggers.py
+"""
+
+import random
+
+from corpus import WORDS_EN, WORDS_RU, bench, chat_corpus
+from peon_common import functions
+from peon_common.text import TriggerMatcher
+
+
+def triggers(count, seed=3):
+    rng = random.Random(seed)
+    words = [functions.normalize_text(w, simple_mask=True, do_de_latinize=True)
+             for w in WORDS_RU + WORDS_EN]  # fmt: skip
+    result = set(words[:count])
+    while len(result) < count:
+        phrase = " ".join(rng.sample(words, 3))
+        start = rng.randint(0, max(0, len(phrase) - 12))
+        result.add(phrase[start : start + rng.randint(4, 12)])
+    return sorted(result)
+
+
+def run():
+    corpus = [
+        functions.normalize_text(m, simple_mask=True, do_de_latinize=True)
+        for m in chat_corpus(2000)
+    ]
+    print(f"corpus: {len(corpus)} normalized messages")
+
+    for count in (10, 100, 500, 1000):
+        keys = triggers(count)
+        matcher = TriggerMatcher(keys, scan_limit=0)
+        scan = lambda: [[k for k in keys if k in m] for m in corpus]
+        automaton = lambda: [matcher.matches(m) for m in corpus]
+        assert scan() == automaton()
+
+        print(f"{count} triggers:")
+        bench("  substring scan", scan, number=3)
+        bench("  automaton", automaton, number=3)
+
+
+if __name__ == "__main__":
+    run()
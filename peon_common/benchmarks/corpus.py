@@ -0,0 +1,42 @@
+"""Synthetic chat message corpora and timing helpers for benchmarks."""
+
+import random
+import timeit
+
+
+WORDS_EN = (
+    "lol ok what when gg wp anyone up for dungeon tonight raid is at nine "
+    "bring flasks need tank healer dps where are you guys this boss is broken "
+    "patch notes nerf buff again pls help how much for arcanite bar"
+).split()
+WORDS_RU = (
+    "привет как дела что делаешь го в рейд сегодня вечером кто танк нужен "
+    "хил опять вайп этот босс сломан скинь ссылку сколько стоит ёлки палки "
+    "ну да конечно спасибо пожалуйста бро щас буду"
+).split()
+WORDS_LAYOUT = "ghbdtn rfr ltkf xnj ltkftim ujdjhb ctujlyz".split()
+NOISE = ["!!", "?", "...", ":)", ")))", "😂", "🔥", "*", "_", "~", "123", "[link]", "+1"]
+
+
+def chat_corpus(size=5000, seed=42) -> list[str]:
+    """Generate a reproducible list of chat-like messages."""
+
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(size):
+        pool = rng.choice([WORDS_EN, WORDS_RU, WORDS_RU + WORDS_EN, WORDS_LAYOUT])
+        length = max(1, int(rng.expovariate(1 / 12)))
+        words = [rng.choice(pool) for _ in range(length)]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randint(0, len(words)), rng.choice(NOISE))
+        message = " ".join(words)
+        messages.append(message.capitalize() if rng.random() < 0.3 else message)
+    return messages
+
+
+def bench(label, func, number=5, repeat=3) -> float:
+    """Time `func` and print best-of-`repeat` per-call time."""
+
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print(f"{label:<48} {best * 1000:10.3f} ms")
+    return best
@@ -0,0 +1,166 @@
+"""In-process caches."""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Self
+
+import requests
+
+
+MISSING = object()
+"""Sentinel for cache misses (cached values may legitimately be `None`)."""
+
+
+class TTLCache:
+    """Thread-safe LRU cache with optional per-entry expiration.
+
+    - maxsize (int): entries kept before least recently used ones are evicted
+    - ttl (float, optional (None)): default seconds an entry stays valid,
+      entries never expire when `None`
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value, or `default` if missing or expired."""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires <= self.clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        """Store value, `ttl` overrides the cache-wide default."""
+
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else self.clock() + ttl
+
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove entry, returning its value."""
+
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass
+class CachedResponse:
+    """Parsed upstream response along with its revalidation details."""
+
+    value: Any
+    fresh_until: float
+    etag: str = None
+    last_modified: str = None
+
+
+class HTTPCache:
+    """Response cache for GET requests to external APIs.
+
+    Entries are served without touching upstream for `ttl` seconds (misses,
+    i.e. `parse` returning `None`, for `negative_ttl`). Stale entries are kept
+    for up to `stale_ttl` seconds and revalidated with
+    `If-None-Match`/`If-Modified-Since` when upstream provided validators.
+    Errors raised by `parse` are never cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 60 * 60,
+        negative_ttl: float = 10 * 60,
+        stale_ttl: float = 24 * 60 * 60,
+        session: Any = requests,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.session = session
+        self.clock = clock
+        self.entries = TTLCache(maxsize=maxsize, ttl=stale_ttl, clock=clock)
+
+    def fetch(
+        self,
+        key: Hashable,
+        url: str,
+        parse: Callable[[requests.Response], Any],
+        headers: dict = None,
+        **kwargs,
+    ) -> Any:
+        """Return cached value for `key`, requesting `url` when needed.
+
+        - key (hashable): cache key (normalized query)
+        - url (str): resource to request
+        - parse (callable): turns a response into a value, `None` for misses
+        - headers (dict, optional): request headers
+        - kwargs: passed through to `session.get`
+        """
+
+        now = self.clock()
+        entry = self.entries.get(key)
+        if entry is not None and entry.fresh_until > now:
+            return entry.value
+
+        headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = self.session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            entry.fresh_until = now + self.ttl
+            self.entries.set(key, entry)
+            return entry.value
+
+        value = parse(response)
+        if value is None:
+            self.entries.set(
+                key, CachedResponse(None, now + self.negative_ttl), self.negative_ttl
+            )
+        else:
+            self.entries.set(
+                key,
+                CachedResponse(
+                    value,
+                    now + self.ttl,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                ),
+            )
+        return value
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from copy import deepcopy
 from typing import Self
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from mongoengine import (
     connect as _connect,
@@ -15,6 +15,8 @@ from mongoengine import (
     DynamicField,
     EmbeddedDocument,
     EmbeddedDocumentField,
+    FloatField,
+    IntField,
     ListField,
     StringField,
 )
@@ -169,10 +171,40 @@ class GPTRoleSetting(BaseDocument):
 
     @classmethod
     def set(cls, owner_id: str, role_description: str) -> bool:
-        existing = cls.get(owner_id)
-        if existing:
-            existing.delete()
-        cls(owner_id=owner_id, role_description=role_description).save()
+        """Create or replace owner's role description (single atomic upsert)."""
+
+        return bool(
+            cls.objects(owner_id=owner_id).update_one(
+                set__role_description=role_description, upsert=True
+            )
+        )
+
+    @classmethod
+    def remove(cls, owner_id: str) -> bool:
+        """Delete owner's role description, returns whether there was one."""
+
+        return bool(cls.objects(owner_id=owner_id).delete())
+
+
+class GPTModelSetting(BaseDocument):
+    """GPT model override for specific owner (bypasses model routing)."""
+
+    owner_id = StringField(unique=True, required=True)
+    model = StringField(required=True)
+
+    @classmethod
+    def get(cls, owner_id: str) -> Self:
+        return cls.find_one(owner_id=owner_id)
+
+    @classmethod
+    def set(cls, owner_id: str, model: str) -> bool:
+        return bool(
+            cls.objects(owner_id=owner_id).update_one(set__model=model, upsert=True)
+        )
+
+    @classmethod
+    def remove(cls, owner_id: str) -> bool:
+        return bool(cls.objects(owner_id=owner_id).delete())
 
 
 class GPTChatInteraction(EmbeddedDocument):
@@ -198,7 +230,8 @@ class GPTChatHistory(BaseDocument):
             },
             <...>,
         ],
-        <...>,
+        "summary": str,
+        "summarized_until": int,
     }
     """
 
@@ -206,6 +239,9 @@ class GPTChatHistory(BaseDocument):
     interactions = ListField(
         EmbeddedDocumentField(GPTChatInteraction), max_length=MAX_SAVED_GPT_INTERACTIONS
     )
+    summary = StringField()
+    """Running summary of interactions up to `summarized_until`."""
+    summarized_until = DateTimeField()
 
     @classmethod
     def store(cls, owner_id: str, user: str, system: str, timestamp: int = None) -> None:
@@ -256,3 +292,115 @@ class GPTChatHistory(BaseDocument):
             return formatted
         else:
             return []
+
+    @classmethod
+    def fetch_with_summary(
+        cls, owner_id: str, after_ts: int = None
+    ) -> tuple[str | None, list]:
+        """
+        Fetches running summary along with interactions it does not cover yet
+        (formatted as in `fetch`).
+
+        - owner_id (str): User ID the conversation belongs to
+        - after_ts (int, optional (None)): fetch messages after certain timestamp
+        """
+
+        document = cls.find_one(owner_id=owner_id)
+        if not document:
+            return None, []
+
+        if document.summarized_until and (
+            not after_ts or after_ts <= document.summarized_until
+        ):
+            after_ts = document.summarized_until + timedelta(microseconds=1)
+
+        formatted = []
+        for message in document.interactions:
+            if not after_ts or after_ts <= message.timestamp:
+                formatted.append({"role": "user", "content": message.user_message})
+                formatted.append({"role": "assistant", "content": message.system_reply})
+        return document.summary, formatted
+
+    def unsummarized(self) -> list[GPTChatInteraction]:
+        """Interactions not covered by running summary yet, oldest first."""
+
+        return sorted(
+            (
+                interaction
+                for interaction in self.interactions
+                if not self.summarized_until
+                or interaction.timestamp > self.summarized_until
+            ),
+            key=lambda interaction: interaction.timestamp,
+        )
+
+    @classmethod
+    def store_summary(cls, owner_id: str, summary: str, until: datetime) -> None:
+        """Replaces running summary (without touching interactions)."""
+
+        cls.objects(owner_id=owner_id).update_one(
+            set__summary=summary, set__summarized_until=until
+        )
+
+
+class GPTUsage(BaseDocument):
+    """
+    Daily GPT usage counters per owner and model.
+
+    Structure:
+    {
+        "day": datetime,
+        "owner_id": str,
+        "model": str,
+        "requests": int,
+        "prompt_tokens": int,
+        "completion_tokens": int,
+        "wall_time": float,
+    }
+    """
+
+    meta = {"indexes": [{"fields": ["day", "owner_id", "model"], "unique": True}]}
+
+    day = DateTimeField(required=True)
+    owner_id = StringField(required=True)
+    model = StringField(required=True)
+    requests = IntField(default=0)
+    prompt_tokens = IntField(default=0)
+    completion_tokens = IntField(default=0)
+    wall_time = FloatField(default=0)
+    """Total seconds spent waiting for completions."""
+
+    @classmethod
+    def add(cls, day: datetime, owner_id: str, model: str, **counters) -> None:
+        """Atomically increments day's counters (`requests=1, ...`)."""
+
+        cls.objects(day=day, owner_id=owner_id, model=model).update_one(
+            upsert=True, **{f"inc__{name}": value for name, value in counters.items()}
+        )
+
+    @classmethod
+    def totals(cls, since: datetime, limit: int = 10) -> list[dict]:
+        """Per-owner totals since `since`, heaviest users (by tokens) first."""
+
+        return list(
+            cls.objects(day__gte=since).aggregate(
+                [
+                    {
+                        "$group": {
+                            "_id": "$owner_id",
+                            "requests": {"$sum": "$requests"},
+                            "prompt_tokens": {"$sum": "$prompt_tokens"},
+                            "completion_tokens": {"$sum": "$completion_tokens"},
+                            "wall_time": {"$sum": "$wall_time"},
+                        }
+                    },
+                    {
+                        "$addFields": {
+                            "tokens": {"$add": ["$prompt_tokens", "$completion_tokens"]}
+                        }
+                    },
+                    {"$sort": {"tokens": -1}},
+                    {"$limit": limit},
+                ]
+            )
+        )
@@ -0,0 +1,385 @@
+"""Dice expressions: parsing, rolling and exact probabilities."""
+
+import random
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from .exceptions import CommandMalformed
+
+
+DICE_LIMIT = 10**30
+"""Maximum dice size/range value."""
+
+THROWS_LIMIT = 10**6
+"""Maximum amount of dice thrown per request."""
+
+TERMS_LIMIT = 100
+"""Maximum amount of dice terms (pools/ranges) per request."""
+
+LEGACY_THROWS_LIMIT = 100
+"""Maximum throws for dice too large to be drawn with NumPy."""
+
+NUMPY_BOUND = 2**62
+"""Dice/ranges with values (and pool sums) below this bound are drawn with NumPy."""
+
+HISTOGRAM_MAX_SIDES = 20
+"""Maximum dice size for which summaries include a histogram."""
+
+MESSAGE_LIMIT = 1900
+"""Rolls text length after which pools are summarized instead of listed."""
+
+SUPPORT_LIMIT = 10**6
+"""Maximum amount of possible totals for probability calculations."""
+
+DIRECT_CONVOLUTION_LIMIT = 10**6
+"""Vector length product after which convolutions are computed via FFT."""
+
+FFT_WORK_LIMIT = 2**22
+"""Maximum total FFT length per probability calculation (keeps `odds` fast)."""
+
+FFT_NOISE = 1e-12
+"""FFT convolution values below this share of the peak are rounding noise."""
+
+PERCENTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+"""Percentiles reported by `odds`."""
+
+COMPARISONS = {
+    ">=": lambda totals, target: totals >= target,
+    "<=": lambda totals, target: totals <= target,
+    ">": lambda totals, target: totals > target,
+    "<": lambda totals, target: totals < target,
+    "==": lambda totals, target: totals == target,
+    "=": lambda totals, target: totals == target,
+}
+"""Supported `odds` comparison operators."""
+
+ODDS_PATTERN = re.compile(
+    r"^(?P<dice>[^<>=]+?)\s*(?:(?P<op>>=|<=|==|=|>|<)\s*(?P<target>-?\d+))?$"
+)
+"""`odds` expression: dice terms (as in `roll`), optionally compared to a number."""
+
+TERM_PATTERN = re.compile(
+    r"^(?:(?P<throws>\d*)d(?P<sides>\d+)|(?P<die>\d+)|(?P<low>\d+)-(?P<high>\d+))$"
+)
+"""Dice term grammar: `NdM`, `dM`, `M` (single M-sided die) or `a-b` (range)."""
+
+RNG = np.random.default_rng()
+"""Shared random generator."""
+
+
+@dataclass(frozen=True)
+class Term:
+    """A pool of identical dice, each producing a value in `[low, high]`."""
+
+    throws: int
+    low: int
+    high: int
+    label: str
+
+    @property
+    def numpy_safe(self) -> bool:
+        return self.throws * max(abs(self.low), abs(self.high)) < NUMPY_BOUND
+
+
+def parse_term(text: str) -> Term:
+    """Parse single dice term."""
+
+    m = TERM_PATTERN.match(text.strip())
+    if not m:
+        raise CommandMalformed(f"Invalid dice: '{text}'")
+
+    if m.group("low") is not None:
+        low, high = int(m.group("low")), int(m.group("high"))
+        if low > DICE_LIMIT or high > DICE_LIMIT:
+            raise CommandMalformed("range value(s) are too high")
+        if low > high:
+            low, high = high, low
+        return Term(1, low, high, f"{low}-{high}:")
+
+    throws = int(m.group("throws") or 1)
+    sides = int(m.group("sides") or m.group("die"))
+    if sides == 0 or throws == 0:
+        raise CommandMalformed("wrong arg")
+    if throws > THROWS_LIMIT or sides > DICE_LIMIT:
+        raise CommandMalformed("dice size/throw count is too high")
+
+    return Term(throws, 1, sides, f"{throws}d{sides}:")
+
+
+def parse(terms: list[str]) -> list[Term]:
+    """Parse dice terms, validating request-wide limits."""
+
+    parsed = [parse_term(term) for term in terms]
+    if not parsed:
+        raise CommandMalformed("Dice required")
+    if len(parsed) > TERMS_LIMIT:
+        raise CommandMalformed(f"too many dice terms (>{TERMS_LIMIT})")
+    if sum(term.throws for term in parsed) > THROWS_LIMIT:
+        raise CommandMalformed(f"too many dice (>{THROWS_LIMIT})")
+    for term in parsed:
+        if not term.numpy_safe and term.throws > LEGACY_THROWS_LIMIT:
+            raise CommandMalformed("dice size/throw count is too high")
+
+    return parsed
+
+
+def draw(terms: list[Term], rng: np.random.Generator = None) -> list[np.ndarray]:
+    """Roll every term, returning an array of values per term.
+
+    All NumPy-safe dice are drawn with a single vectorized call; huge dice
+    (beyond int64) fall back to Python's arbitrary precision `random`.
+    """
+
+    rng = rng or RNG
+    results = [None] * len(terms)
+    vectorized = [i for i, term in enumerate(terms) if term.numpy_safe]
+
+    if vectorized:
+        throws = np.array([terms[i].throws for i in vectorized])
+        lows = np.repeat([terms[i].low for i in vectorized], throws)
+        highs = np.repeat([terms[i].high for i in vectorized], throws)
+        values = rng.integers(lows, highs, endpoint=True)
+        for i, chunk in zip(vectorized, np.split(values, np.cumsum(throws)[:-1])):
+            results[i] = chunk
+
+    for i, term in enumerate(terms):
+        if results[i] is None:
+            results[i] = np.array(
+                [random.randint(term.low, term.high) for _ in range(term.throws)],
+                dtype=object,
+            )
+
+    return results
+
+
+def summarize(term: Term, values: np.ndarray, detail: int = 2) -> str:
+    """Short description of a rolled pool.
+
+    Detail 2 is sum, mean, extremes and histogram (small dice only), 1 drops
+    the histogram and 0 leaves just the sum.
+    """
+
+    total = int(values.sum())
+    if detail < 1:
+        return f"{term.label} sum {total}"
+
+    text = (
+        f"{term.label} sum {total}, mean {total / term.throws:.2f}, "
+        f"min {int(values.min())}, max {int(values.max())}"
+    )
+    if (
+        detail > 1
+        and term.high - term.low < HISTOGRAM_MAX_SIDES
+        and values.dtype != object
+    ):
+        counts = np.bincount(values - term.low, minlength=term.high - term.low + 1)
+        text += "\n  " + " ".join(
+            f"{term.low + value}×{count}" for value, count in enumerate(counts)
+        )
+    return text
+
+
+def roll(terms: list[str], limit: int = MESSAGE_LIMIT, rng=None) -> str:
+    """Roll dice terms and format results.
+
+    Pools are listed die by die while the text fits into `limit`, the longest
+    listings are replaced by summaries otherwise. Summaries are shortened the
+    same way and, if even pool sums don't fit, only the total is kept.
+    """
+
+    parsed = parse(terms)
+    rolls = draw(parsed, rng)
+
+    if len(rolls) == 1 and len(rolls[0]) == 1:
+        return f"rolls: {int(rolls[0][0])}"
+
+    total = sum(int(values.sum()) for values in rolls)
+    footer = f"---\ntotal: {total}"
+    lines = [None] * len(parsed)
+    # detail level per line: 3 for listings, `summarize` levels for the rest
+    details = [None] * len(parsed)
+    length = len("rolls:\n") + len(footer)
+
+    for index, (term, values) in enumerate(zip(parsed, rolls)):
+        if term.throws > limit // 2:
+            lines[index], details[index] = summarize(term, values), 2
+        else:
+            lines[index] = f"{term.label} {', '.join(map(str, values.tolist()))}"
+            details[index] = 3
+        length += len(lines[index]) + 1
+
+    for detail in (2, 1, 0):
+        for index in sorted(
+            range(len(lines)), key=lambda i: len(lines[i]), reverse=True
+        ):
+            if length <= limit:
+                break
+            if details[index] <= detail:
+                continue
+            summary = summarize(parsed[index], rolls[index], detail)
+            length += len(summary) - len(lines[index])
+            lines[index], details[index] = summary, detail
+
+    if length > limit:
+        throws = sum(term.throws for term in parsed)
+        lines = [f"{len(parsed)} pools, {throws} dice"]
+
+    return "rolls:\n" + "\n".join(lines) + f"\n{footer}"
+
+
+def direct(a: np.ndarray, b: np.ndarray) -> bool:
+    """Whether convolution of the vectors is computed directly (exactly)."""
+
+    return len(a) * len(b) <= DIRECT_CONVOLUTION_LIMIT
+
+
+def fft_length(a: int, b: int) -> int:
+    """FFT length for convolving vectors of lengths `a` and `b`.
+
+    Power of two, arbitrary lengths may be an order of magnitude slower.
+    """
+
+    return 1 << (a + b - 2).bit_length()
+
+
+def convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Convolve probability vectors, switching to FFT for long ones.
+
+    FFT results are approximate, values indistinguishable from rounding noise
+    are zeroed.
+    """
+
+    if direct(a, b):
+        return np.convolve(a, b)
+
+    size, length = len(a) + len(b) - 1, fft_length(len(a), len(b))
+    result = np.fft.irfft(np.fft.rfft(a, length) * np.fft.rfft(b, length), length)
+    result = result[:size]
+    result[result < result.max() * FFT_NOISE] = 0
+    return result
+
+
+def term_distribution(term: Term) -> tuple[np.ndarray, bool]:
+    """Probability vector of a term's total and whether it is exact.
+
+    The vector starts at `throws * low`.
+    """
+
+    die = np.full(term.high - term.low + 1, 1 / (term.high - term.low + 1))
+    result = np.ones(1)
+    throws = term.throws
+    exact = True
+
+    while throws:
+        if throws & 1:
+            exact &= direct(result, die)
+            result = convolve(result, die)
+        throws >>= 1
+        if throws:
+            exact &= direct(die, die)
+            die = convolve(die, die)
+
+    return result, exact
+
+
+def fft_work(terms: list[Term]) -> int:
+    """Total FFT length `distribution` of terms takes.
+
+    Mirrors its convolution steps on vector lengths only; direct convolutions
+    are cheap in comparison.
+    """
+
+    work = 0
+
+    def convolved(a, b):
+        nonlocal work
+        if a * b > DIRECT_CONVOLUTION_LIMIT:
+            work += fft_length(a, b)
+        return a + b - 1
+
+    total = 1
+    for term in terms:
+        die, result, throws = term.high - term.low + 1, 1, term.throws
+        while throws:
+            if throws & 1:
+                result = convolved(result, die)
+            throws >>= 1
+            if throws:
+                die = convolved(die, die)
+        total = convolved(total, result)
+
+    return work
+
+
+def distribution(terms: list[Term]) -> tuple[int, np.ndarray, bool]:
+    """Distribution of the sum of all terms as (lowest total, probabilities, exact).
+
+    Only long convolutions (computed via FFT) make it approximate.
+    """
+
+    support = sum(term.throws * (term.high - term.low) for term in terms) + 1
+    if support > SUPPORT_LIMIT:
+        raise CommandMalformed(f"too many possible outcomes (>{SUPPORT_LIMIT})")
+    if fft_work(terms) > FFT_WORK_LIMIT:
+        raise CommandMalformed("expression is too complex to compute odds for")
+
+    offset = sum(term.throws * term.low for term in terms)
+    probabilities = np.ones(1)
+    exact = True
+    for term in terms:
+        vector, term_exact = term_distribution(term)
+        exact &= term_exact and direct(probabilities, vector)
+        probabilities = convolve(probabilities, vector)
+
+    return offset, probabilities / probabilities.sum(), exact
+
+
+def format_probability(p: float) -> str:
+    """Percentage with two decimals, scientific notation for tiny values."""
+
+    if p <= 0:
+        return "0%"
+    if p < 1e-4:
+        return f"{p * 100:.2e}%"
+    return f"{p * 100:.2f}%"
+
+
+def odds(expression: str) -> str:
+    """Probability of a dice expression, e.g. `3d6+2d4 >= 14`.
+
+    Uses the same terms as `roll` (separated by `+` or spaces); totals are
+    computed by convolving per-die probability vectors instead of simulating.
+    Probabilities of huge pools come from FFT and are marked approximate (≈).
+    """
+
+    m = ODDS_PATTERN.match(expression.strip().lower())
+    if not m:
+        raise CommandMalformed(f"Invalid expression: '{expression}'")
+
+    dice_text = m.group("dice")
+    terms = parse(dice_text.replace("+", " ").split())
+    offset, probabilities, exact = distribution(terms)
+    totals = np.arange(offset, offset + len(probabilities))
+    cdf = np.cumsum(probabilities)
+    mean = float(totals @ probabilities)
+    percentiles = np.array(PERCENTILES) - 1e-9
+
+    lines = [f"{dice_text} ({totals[0]}-{totals[-1]}, mean {mean:.2f}):"]
+    if m.group("op"):
+        op, target = m.group("op"), int(m.group("target"))
+        p = float(probabilities[COMPARISONS[op](totals, target)].sum())
+        lines.append(
+            f"P({op} {target}) {'=' if exact else '≈'} "
+            f"{format_probability(min(p, 1.0))}"
+        )
+    lines.append(
+        "percentiles: "
+        + " | ".join(
+            f"{round(q * 100)}%: {totals[index]}"
+            for q, index in zip(PERCENTILES, np.searchsorted(cdf, percentiles))
+        )
+    )
+
+    return "\n".join(lines)
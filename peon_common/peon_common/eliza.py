@@ -0,0 +1,178 @@
+"""Eliza psychotherapist with per-user dialog sessions."""
+
+import functools
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Hashable, Self
+
+
+SESSIONS_LIMIT = 1000
+"""Maximum amount of concurrently kept sessions."""
+
+SESSION_IDLE_TIMEOUT = 60 * 60
+"""Seconds of inactivity after which a session is dropped."""
+
+MEMORY_LIMIT = 2 * 2**20
+"""Maximum total size (characters) of text kept across all sessions."""
+
+SESSION_HISTORY = 8
+"""Interactions remembered per session."""
+
+MEMORY_ITEM_LENGTH = 200
+"""Maximum length of a single remembered statement."""
+
+MEMORY_PATTERN = re.compile(r"^my (.*)$", re.IGNORECASE)
+"""User statements worth bringing up later on (classic Eliza memory)."""
+
+MEMORY_RECALL = [
+    "Earlier you said your %1.",
+    "But your %1.",
+    "Does that have anything to do with the fact that your %1?",
+    "Let's discuss further why your %1.",
+]
+"""Replies recalling remembered statements."""
+
+
+class ElizaEngine:
+    """Compiled Eliza patterns and reflections, shared by all sessions."""
+
+    def __init__(self, pairs, reflections) -> Self:
+        self.pairs = [(re.compile(x, re.IGNORECASE), y) for (x, y) in pairs]
+        self.fallback = self.pairs[-1][0].pattern == "(.*)"
+        self.reflections = reflections
+        self.reflection_pattern = re.compile(
+            r"\b({})\b".format(
+                "|".join(map(re.escape, sorted(reflections, key=len, reverse=True)))
+            ),
+            re.IGNORECASE,
+        )
+
+    def reflect(self, text: str) -> str:
+        """Swap first and second person expressions ("i am" -> "you are")."""
+
+        return self.reflection_pattern.sub(
+            lambda m: self.reflections[m.group().lower()], text.lower()
+        )
+
+    def fill(self, template: str, groups: tuple) -> str:
+        """Substitute `%N` placeholders with reflected match groups."""
+
+        response = re.sub(
+            r"%(\d)", lambda m: self.reflect(groups[int(m.group(1)) - 1] or ""), template
+        )
+        if response[-2:] == "?.":
+            response = response[:-2] + "."
+        if response[-2:] == "??":
+            response = response[:-2] + "?"
+        return response
+
+
+@functools.lru_cache(maxsize=None)
+def engine() -> ElizaEngine:
+    """Load nltk Eliza script (lazily, on first use) and compile it."""
+
+    from nltk.chat.eliza import pairs
+    from nltk.chat.util import reflections
+
+    return ElizaEngine(pairs, reflections)
+
+
+class ElizaSession:
+    """Single user's dialog: recent replies and remembered statements."""
+
+    def __init__(self, engine: ElizaEngine, history: int = SESSION_HISTORY) -> Self:
+        self.engine = engine
+        self.replies = deque(maxlen=history)
+        self.memories = deque(maxlen=history)
+        self.last_used = 0.0
+
+    @property
+    def size(self) -> int:
+        """Approximate amount of stored text."""
+
+        return sum(map(len, self.replies)) + sum(map(len, self.memories))
+
+    def respond(self, text: str) -> str:
+        text = text.strip().rstrip("!.")
+
+        for index, (pattern, templates) in enumerate(self.engine.pairs):
+            if not (match := pattern.match(text)):
+                continue
+
+            is_fallback = self.engine.fallback and index == len(self.engine.pairs) - 1
+            if is_fallback and self.memories and random.random() < 0.5:
+                memory = self.memories.popleft()
+                reply = self.engine.fill(random.choice(MEMORY_RECALL), (memory,))
+            else:
+                fresh = [t for t in templates if t not in self.replies] or templates
+                template = random.choice(fresh)
+                self.replies.append(template)
+                reply = self.engine.fill(template, match.groups())
+
+            if remembered := MEMORY_PATTERN.match(text):
+                self.memories.append(remembered.group(1)[:MEMORY_ITEM_LENGTH])
+
+            return reply
+
+
+class ElizaPool:
+    """Bounded pool of per-owner Eliza sessions.
+
+    Least recently used sessions are evicted once `maxsize` sessions or
+    `memory_limit` characters of stored text are exceeded; sessions idle for
+    longer than `idle_timeout` seconds are dropped.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = SESSIONS_LIMIT,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        memory_limit: int = MEMORY_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.memory_limit = memory_limit
+        self.clock = clock
+        self.sessions: OrderedDict[Hashable, ElizaSession] = OrderedDict()
+        self.memory = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self.sessions:
+            owner, session = next(iter(self.sessions.items()))
+            if (
+                len(self.sessions) <= self.maxsize
+                and self.memory <= self.memory_limit
+                and now - session.last_used < self.idle_timeout
+            ):
+                break
+            self.memory -= session.size
+            del self.sessions[owner]
+
+    def respond(self, owner_id: Hashable, text: str) -> str:
+        """Reply to text within owner's session."""
+
+        with self._lock:
+            now = self.clock()
+            session = self.sessions.pop(owner_id, None)
+            if session is None or now - session.last_used >= self.idle_timeout:
+                if session:
+                    self.memory -= session.size
+                session = ElizaSession(engine())
+
+            self.memory -= session.size
+            reply = session.respond(text)
+            self.memory += session.size
+            session.last_used = now
+            self.sessions[owner_id] = session
+            self._evict(now)
+
+            return reply
+
+
+ELIZA = ElizaPool()
+"""Global Eliza session pool."""
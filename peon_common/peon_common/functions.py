@@ -1,5 +1,8 @@
 """Various functionality to be used as commands by messaging clients."""
 
+import functools
+import hashlib
+import io
 import json
 import os
 import random
@@ -8,68 +11,29 @@ import requests
 import socket
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import nltk.chat.eliza
+import numpy as np
 import psutil
+from PIL import Image
 
+from . import dice, text as text_tools
 from .ah import NORDNAAR_AH_SCRAPER
+from .cache import HTTPCache, TTLCache
+from .eliza import ELIZA
+from .metrics import HOST_METRICS
 from .exceptions import (
     CommandExecutionError,
     CommandMalformed,
+    ServiceUnavailable,
 )
+from .morse import MORSE, MORSE_CODE
+from .utils import ENV_WIKI_LANGUAGES
 
 
 BYTES_GB = 2**30
 """Bytes in a gigabyte."""
 
-MORSE_CODE = {
-    "a": ".-",
-    "b": "-...",
-    "c": "-.-.",
-    "d": "-..",
-    "e": ".",
-    "f": "..-.",
-    "g": "--.",
-    "h": "....",
-    "i": "..",
-    "j": ".---",
-    "k": "-.-",
-    "l": ".-..",
-    "m": "--",
-    "n": "-.",
-    "o": "---",
-    "p": ".--.",
-    "q": "--.-",
-    "r": ".-.",
-    "s": "...",
-    "t": "-",
-    "u": "..-",
-    "v": "...-",
-    "w": ".--",
-    "x": "-..-",
-    "y": "-.--",
-    "z": "--..",
-    "1": ".----",
-    "2": "..---",
-    "3": "...--",
-    "4": "....-",
-    "5": ".....",
-    "6": "-....",
-    "7": "--...",
-    "8": "---..",
-    "9": "----.",
-    "0": "-----",
-    ", ": "--..--",
-    ".": ".-.-.-",
-    "?": "..--..",
-    "/": "-..-.",
-    "-": "-....-",
-    "(": "-.--.",
-    ")": "-.--.-",
-    " ": " ",
-}
-"""Morse code dictionary."""
-
 ICOSAHEDRON = [
     "As I see it, yes.",
     "Ask again later.",
@@ -224,6 +188,9 @@ punto_map = {
     ".": "ю",
 }
 punto_map_reversed = {v: k for k, v in punto_map.items()}
+punto_charmap = text_tools.CharMap(punto_map)
+punto_charmap_reversed = text_tools.CharMap(punto_map_reversed)
+translit_charmap = text_tools.CharMap(translit_map)
 tr_endpoints = {
     "clients5": {
         "url_template": "https://clients5.google.com/translate_a/t?"
@@ -240,7 +207,55 @@ tr_endpoints = {
 }
 default_chance = 15
 simple_replies_collection = {"specific_name": [50, [""]]}
+_simple_replies_matcher = (None, None)
 ascii_ascending_luminance = ".,-~:;=!*#$@"
+ASCII_ART_MAX_WIDTH = 64
+"""Maximum ASCII art width (wider lines wrap on mobile clients)."""
+ASCII_ART_CHAR_ASPECT = 0.5
+"""Monospace character width to height ratio."""
+ASCII_ART_MAX_PIXELS = 4000 * 4000
+"""Largest image (in pixels) rendered as ASCII art, checked before decoding."""
+ASCII_ART_CACHE = TTLCache(maxsize=256)
+"""Rendered ASCII art by image hash and size limit."""
+
+WIKI_CACHE = HTTPCache(maxsize=1024, ttl=6 * 60 * 60, negative_ttl=30 * 60)
+"""Wikipedia summaries by language and normalized query."""
+
+WIKI_LANGUAGES = ["en", "ru", "et"]
+"""Wikipedia languages queried by default, in order of preference."""
+
+WIKI_TIMEOUT = 5
+"""Seconds to wait for a single Wikipedia response."""
+
+WIKI_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="wiki")
+"""Executor for concurrent multi-language Wikipedia lookups."""
+
+URBAN_CACHE = HTTPCache(maxsize=1024, ttl=24 * 60 * 60, negative_ttl=60 * 60)
+"""Urban dictionary definitions by normalized query (RapidAPI calls are billed)."""
+
+
+def set_simple_replies(collection: dict) -> None:
+    """Replace simple replies collection and rebuild its trigger matcher."""
+
+    global simple_replies_collection, _simple_replies_matcher
+
+    simple_replies_collection = collection
+    _simple_replies_matcher = (collection, text_tools.TriggerMatcher(collection))
+
+
+def find_simple_replies(text: str) -> list:
+    """Return `(trigger, [chance, phrases])` pairs matching normalized text.
+
+    Pairs are returned in collection order. The trigger matcher is built
+    once per collection (see `set_simple_replies`).
+    """
+
+    collection, matcher = _simple_replies_matcher
+    if collection is not simple_replies_collection:
+        set_simple_replies(simple_replies_collection)
+        collection, matcher = _simple_replies_matcher
+
+    return [(k, collection[k]) for k in matcher.matches(text)]
 
 
 def de_latinize(text):
@@ -251,23 +266,7 @@ def de_latinize(text):
     :return: normalized text
     """
 
-    chars = {
-        "e": "е",
-        "t": "т",
-        "y": "у",
-        "o": "о",
-        "p": "р",
-        "a": "а",
-        "h": "н",
-        "k": "к",
-        "x": "х",
-        "c": "с",
-        "b": "в",
-        "m": "м",
-    }
-    for k, v in chars.items():
-        text = text.replace(k, v)
-    return text
+    return text_tools.DE_LATINIZE(text)
 
 
 def transform_special_characters(text):
@@ -278,10 +277,7 @@ def transform_special_characters(text):
     :return: transformed text
     """
 
-    coll = {"}{": "х", "III": "ш", "()": "o"}
-    for k, v in coll.items():
-        text = text.replace(k, v)
-    return text
+    return text_tools.SPECIAL_CHARACTERS(text)
 
 
 def normalize_text(
@@ -295,19 +291,12 @@ def normalize_text(
     :param bool special_chars: switch complex sequences with similar chars
     """
 
-    if simple_mask:
-        text = re.sub(
-            r"\^|\$|!|#|%|^|&|€|£|¢|¥|§|<|>|\?|~|\*|,|[0-9]|:|;|\[|\]|=|-|\+|_",
-            "",
-            text.lower(),
-        ).replace("ё", "е")
-    if do_de_latinize:
-        text = de_latinize(text)
-    if special_chars:
-        text = transform_special_characters(text)
-    if markdown:
-        text = re.sub(r"\*|_|~|", "", text)
-    return text
+    return text_tools.normalizer(
+        simple_mask=simple_mask,
+        do_de_latinize=do_de_latinize,
+        special_chars=special_chars,
+        markdown=markdown,
+    )(text)
 
 
 def translate(text, lang_from=None, lang_to=None, endpoint="translate"):
@@ -361,79 +350,67 @@ def mangle(text, resulting_lang="ru", hops=4):
     return text
 
 
-def starify(sentence, limit=600):
-    """Write on a night sky."""
+STARIFY_ALPHABET = " " * 50 + "★★●°°☾☆¸¸¸,..:'"
+"""Night sky characters (spaces weigh in as empty sky)."""
+
+STARIFY_NEXT_CHARS = {
+    char: STARIFY_ALPHABET if char == " " else STARIFY_ALPHABET.replace(char, "")
+    for char in set(STARIFY_ALPHABET)
+}
+"""Characters allowed after each sky character (visible ones never repeat)."""
+
+
+def starify(sentence, limit=600, seed=None):
+    """Write on a night sky.
+
+    Words are spread evenly across `limit` characters. Passing `seed` makes
+    the output reproducible (and cached).
+    """
+
+    if seed is not None:
+        return _starify_cached(sentence, limit, seed)
+    return _starify(sentence, limit, random.Random())
+
 
-    alphabet = " " * 50 + "★★●°°☾☆¸¸¸,..:'"
-    excluded = " "
+@functools.lru_cache(maxsize=256)
+def _starify_cached(sentence, limit, seed):
+    return _starify(sentence, limit, random.Random(seed))
+
+
+def _starify(sentence, limit, rng):
     words = sentence.split(" ")
+    words = (
+        [f" {words[0]}.. "]
+        + [f" ..{word}.. " for word in words[1:-1]]
+        + ([f" ...{words[-1]} "] if len(words) > 1 else [])
+    )
+    stars = max(0, limit - sum(len(w) for w in words))
+    positions = [stars * (i + 1) // (len(words) + 1) for i in range(len(words))]
+
+    sky = [None] * (stars + len(words))
+    for index, (position, word) in enumerate(zip(positions, words)):
+        sky[position + index] = word
 
-    for i in range(len(words)):
-        if i == 0:
-            words[i] = f" {words[i]}.. "
-        elif i == len(words) - 1:
-            words[i] = f" ...{words[i]} "
-        else:
-            words[i] = f" ..{words[i]}.. "
-
-    limit = limit - sum([len(w) for w in words])
-    payload = words
-    points = [int(limit * (i + 1) / (len(payload) + 1)) for i in range(len(payload))]
-    payload = list(zip(points, payload))
-    sky = ""
-    last_char = None
-
-    for _ in range(limit):
-        if len(sky) in points:
-            sky += next(word for point, word in payload if point == len(sky))
-        if last_char is None or last_char in excluded:
-            last_char = random.choice(alphabet)
-        else:
-            last_char = random.choice(alphabet.replace(last_char, ""))
-        sky += last_char
-
-    return sky
+    char = " "
+    choice = rng.choice
+    for index, cell in enumerate(sky):
+        if cell is None:
+            char = choice(STARIFY_NEXT_CHARS[char])
+            sky[index] = char
+
+    return "".join(sky)
 
 
 def roll(roll_indices: list[str]):
     """Roll dice."""
 
-    dice_limit = 10**30
-
-    def get_rolls(s):
-        if "-" in s:
-            left, right = (int(value) for value in re.split(r"-", s))
-            if left > dice_limit or right > dice_limit:
-                raise Exception("range value(s) are too high")
-            return (f"{left}-{right}:", [random.randint(left, right)])
-        else:
-            roll_params = re.split(r"d", s if "d" in s else f"d{s}")
-            throws = 1 if roll_params[0] == "" else int(roll_params[0])
-            sides = int(roll_params[1])
-            if sides == 0:
-                raise Exception("wrong arg")
-            if throws > 100 or sides > dice_limit:
-                raise Exception("dice size/throw count is too high")
-
-            return (
-                f"{throws}d{sides}:",
-                [random.randint(1, sides) for _ in range(throws)],
-            )
-
-    rolls = [get_rolls(_) for _ in roll_indices]
-    text = None
-
-    if len(rolls) == 1 and len(rolls[0][1]) == 1:
-        text = f"rolls: {rolls[0][1][0]}"
-    else:
-        text = "rolls:\n"
-        total = 0
-        for label, value in rolls:
-            text += f"{label} {', '.join([str(_) for _ in value])}\n"
-            total += sum(value)
-        text += f"---\ntotal: {total}"
+    return dice.roll(roll_indices)
 
-    return text
+
+def odds(expression: str) -> str:
+    """Dice probabilities (e.g. `3d6+2d4 >= 14`)."""
+
+    return dice.odds(expression)
 
 
 def slot_sequence(emojis, slots=3, seq_len=8):
@@ -455,6 +432,64 @@ def slot_sequence(emojis, slots=3, seq_len=8):
     return sequence, success
 
 
+def ascii_art_size(width: int, height: int, limit: int) -> tuple[int, int]:
+    """Largest (columns, rows) keeping image aspect that fits into `limit` chars.
+
+    Every row takes an extra character for the line break.
+    """
+
+    ratio = height / width * ASCII_ART_CHAR_ASPECT
+    columns = min(ASCII_ART_MAX_WIDTH, width, int((limit / ratio) ** 0.5) + 1)
+
+    while columns > 1:
+        rows = max(1, round(columns * ratio))
+        if rows * (columns + 1) <= limit:
+            return columns, rows
+        columns -= 1
+
+    return 1, max(1, min(limit // 2, round(ratio)))
+
+
+def image_to_ascii(data: bytes, limit: int = 2000) -> str:
+    """Render image as ASCII art fitting into `limit` characters.
+
+    Results are cached by image hash, so repeated avatars/emojis are free.
+    """
+
+    key = (hashlib.sha1(data).hexdigest(), limit)
+    if (cached := ASCII_ART_CACHE.get(key)) is not None:
+        return cached
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception:
+        raise CommandExecutionError("Unable to read image")
+    if image.width * image.height > ASCII_ART_MAX_PIXELS:
+        raise CommandExecutionError("Image is too large")
+
+    try:
+        columns, rows = ascii_art_size(*image.size, limit)
+        # shrink to the character grid before anything else is done with the
+        # image (box filter averages each character's block; draft speeds JPEG
+        # decoding up), other modes (e.g. palette) can't be box filtered as is
+        image.draft("RGB", (columns, rows))
+        if image.mode not in ("L", "LA", "RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image = image.resize((columns, rows), Image.Resampling.BOX, reducing_gap=2.0)
+        rgba = np.asarray(image.convert("RGBA"), dtype=np.float32)
+    except Exception:
+        raise CommandExecutionError("Unable to read image")
+
+    luminance = rgba[..., :3] @ np.array([0.2126, 0.7152, 0.0722]) * (rgba[..., 3] / 255)
+
+    ramp = np.array(list(ascii_ascending_luminance))
+    levels = (luminance / 256 * len(ramp)).astype(int).clip(0, len(ramp) - 1)
+    art = "\n".join("".join(row) for row in ramp[levels])
+
+    ASCII_ART_CACHE.set(key, art)
+    return art
+
+
 def ask_8ball():
     """Fetch random 8ball message."""
 
@@ -473,23 +508,110 @@ def format_user(user):
     return f"<@{user.id}>"
 
 
-def wiki_summary(query):
-    """Extract first available wiki summary on provided query.
+def normalize_query(query):
+    """Cache key for lookup queries: case and whitespace insensitive."""
+
+    return " ".join(query.split()).casefold()
 
-    :param str query: wiki query
-    """
 
-    uri = f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}"
+def _parse_wiki_summary(response):
+    if response.status_code == 404:
+        return None
+    if not response.ok:
+        raise ServiceUnavailable()
+
     try:
-        req = json.loads(requests.get(uri).text)
+        req = response.json()
         return (
             f"{req['title']}:\n{req['extract']}\n"
             f"({req['content_urls']['desktop']['page']})"
         )
-    except KeyError:
+    except (KeyError, ValueError):
         raise CommandExecutionError()
 
 
+def wiki_languages():
+    """Configured wiki languages (comma separated env var), in order of preference."""
+
+    value = os.environ.get(ENV_WIKI_LANGUAGES, "")
+    return [lang.strip() for lang in value.split(",") if lang.strip()] or WIKI_LANGUAGES
+
+
+def wiki_lookup(lang, query):
+    """Summary from a single language wiki, `None` if there is no such page."""
+
+    uri = (
+        f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/"
+        f"{urllib.parse.quote(query)}"
+    )
+    try:
+        return WIKI_CACHE.fetch(
+            (lang, normalize_query(query)),
+            uri,
+            _parse_wiki_summary,
+            timeout=WIKI_TIMEOUT,
+        )
+    except requests.RequestException:
+        raise ServiceUnavailable()
+
+
+def wiki_summary(query, languages=None):
+    """Extract first available wiki summary on provided query.
+
+    Every language wiki is queried concurrently; the most preferred language
+    having the page wins as soon as all languages before it have missed, and
+    lookups which haven't started yet are cancelled.
+
+    :param str query: wiki query
+    :param list languages: wiki languages in order of preference
+        (defaults to `wiki_languages()`)
+    """
+
+    languages = languages or wiki_languages()
+    if len(languages) == 1:
+        summary = wiki_lookup(languages[0], query)
+        if summary is None:
+            raise CommandExecutionError()
+        return summary
+
+    futures = [WIKI_POOL.submit(wiki_lookup, lang, query) for lang in languages]
+    try:
+        for _ in as_completed(futures, timeout=WIKI_TIMEOUT * 2):
+            for future in futures:
+                if not future.done():
+                    break
+                if future.exception() is None and future.result() is not None:
+                    return future.result()
+    except TimeoutError:
+        raise ServiceUnavailable()
+    finally:
+        for future in futures:
+            future.cancel()
+
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise errors[0]
+    raise CommandExecutionError()
+
+
+def _parse_urban_definition(response):
+    if not response.ok:
+        raise ServiceUnavailable()
+
+    res = response.json()
+    if len(res["list"]):
+        descr = res["list"][0]
+        mask = r"\[|\]"
+        return (
+            descr["word"],
+            re.sub(mask, "", descr["definition"]),
+            re.sub(mask, "", descr["example"]),
+            descr["permalink"],
+        )
+
+    return None
+
+
 def urban_query(token, query):
     """Extract overall urban dictionary definitions
 
@@ -503,44 +625,25 @@ def urban_query(token, query):
         "x-rapidapi-key": token,
     }
     params = {"term": urllib.parse.quote(query)}
-    request = requests.get(
+    return URBAN_CACHE.fetch(
+        normalize_query(query),
         "https://mashape-community-urban-dictionary.p.rapidapi.com/define",
+        _parse_urban_definition,
         headers=headers,
         params=params,
     )
-    res = json.loads(request.text)
-
-    if len(res["list"]):
-        descr = res["list"][0]
-        mask = r"\[|\]"
-        return (
-            descr["word"],
-            re.sub(mask, "", descr["definition"]),
-            re.sub(mask, "", descr["example"]),
-            descr["permalink"],
-        )
-
-    return None
 
 
-def doc(text):
-    """Eliza psychotherapist hotline."""
+def doc(text, owner_id=None):
+    """Eliza psychotherapist hotline (keeps a separate dialog per owner)."""
 
-    # TODO: add dialog buffer support
-    return nltk.chat.eliza.eliza_chatbot.respond(text)
+    return ELIZA.respond(owner_id, text)
 
 
 def is_morse(text):
     """Evaluate if provided text is morse code."""
 
-    chars = {}
-
-    for char in text:
-        chars[char] = chars[char] + 1 if char in chars else 1
-        if char not in [".", "-", " "] or len(chars) > 3:
-            return False
-
-    return True
+    return MORSE.is_morse(text)
 
 
 def from_morse(text):
@@ -549,26 +652,13 @@ def from_morse(text):
     if not isinstance(text, str):
         raise CommandMalformed()
 
-    words = text.split("  ") if "  " in text else [text]
-    words_translated = []
-    morse_map = MORSE_CODE.items()
-
-    for word in (w.strip() for w in words):
-        if word:
-            words_translated.append(
-                "".join(
-                    next((k for k, v in morse_map if v == char), "")
-                    for char in word.split()
-                )
-            )
-
-    return " ".join(words_translated)
+    return "".join(MORSE.decode(text))
 
 
 def to_morse(text):
     """Convert text to morse code."""
 
-    return " ".join(MORSE_CODE[_] for _ in text)
+    return "".join(MORSE.encode(text))
 
 
 def morse_helper(text):
@@ -584,21 +674,25 @@ def punto(text):
     """Attempt to punto switch provided text."""
 
     keys = set(text)
-    latin_count = len([char for char in keys if char in punto_map])
-    cyrillic_count = len([char for char in keys if char in punto_map_reversed])
-    use_map = punto_map if latin_count >= cyrillic_count else punto_map_reversed
-
-    return "".join(use_map.get(char, char) for char in text)
+    latin_count = len(keys.intersection(punto_map))
+    cyrillic_count = len(keys.intersection(punto_map_reversed))
+    if latin_count >= cyrillic_count:
+        return punto_charmap(text)
+    return punto_charmap_reversed(text)
 
 
 def translitify(text):
     """Attempt to convert content into gibberish translit."""
 
-    return "".join([translit_map.get(char) or char for char in text])
+    return translit_charmap(text)
 
 
 def resource_usage(text):
-    """Returns host system resource usage."""
+    """Returns host system resource usage.
+
+    If the background sampler is running, usage history over 1m/15m/1h is
+    appended; pass "proc" to include bot process usage.
+    """
 
     def mem_summary(resource):
         return (
@@ -607,14 +701,23 @@ def resource_usage(text):
             f"{round(resource.total / BYTES_GB, 2)}GB)"
         )
 
-    cpu_avg = psutil.getloadavg()[-1] / psutil.cpu_count() * 100
-    return (
+    if HOST_METRICS.has_data():
+        cpu = HOST_METRICS.series["cpu"].last
+    else:
+        cpu = psutil.cpu_percent(interval=0.1)
+
+    summary = (
         f"{socket.gethostname()}:\n"
-        f"CPU: {round(cpu_avg, 1)}% ({os.cpu_count()} cores)\n"
+        f"CPU: {round(cpu, 1)}% ({os.cpu_count()} cores)\n"
         f"RAM: {mem_summary(psutil.virtual_memory())}\n"
         f"swap: {mem_summary(psutil.swap_memory())}\n"
         f"disk: {mem_summary(psutil.disk_usage('/'))}"
     )
+    if HOST_METRICS.has_data():
+        process = "proc" in (text or "").split()
+        summary += f"\n```\n{HOST_METRICS.summary(process=process)}\n```"
+
+    return summary
 
 
 def ah_query(text: str) -> str:
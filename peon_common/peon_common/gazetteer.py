@@ -0,0 +1,156 @@
+"""Offline city and country name lookup (en/ru/et aliases)."""
+
+import functools
+import json
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+
+CURR_DIR = Path(__file__).resolve(strict=True).parent
+GAZETTEER_PATH = CURR_DIR / "gazetteer.json"
+"""Place names data: `[name, country code / capital query, [aliases]]` entries."""
+
+MAX_NGRAM = 3
+"""Maximum amount of tokens in a place name."""
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+CYRILLIC_ENDINGS = sorted(
+    ["ами", "ями", "ого", "его", "ому", "ему", "ий", "ый", "ой", "ом", "ем",
+     "ей", "ью", "ах", "ях", "ую", "юю", "а", "я", "е", "и", "у", "ю", "ы",
+     "о", "ь"],  # fmt: skip
+    key=len,
+    reverse=True,
+)
+"""Russian case endings stripped when matching inflected names ("в Москве")."""
+
+LATIN_ENDINGS = ["sse", "st", "lt", "le", "ga", "ks", "s", "l"]
+"""Estonian case endings stripped when matching inflected names ("Tallinnas")."""
+
+VOWELS = "aeiouõäöü"
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    query: str
+    """Weather/geocoding query (`city,country code`, capital for countries)."""
+    is_country: bool = False
+
+    @property
+    def country_code(self) -> str:
+        return self.query.rsplit(",", 1)[-1]
+
+
+def fold(text: str) -> str:
+    """Lowercase, drop diacritics from latin letters ("Pärnu" -> "parnu")."""
+
+    def fold_char(char):
+        if char >= "Ѐ":
+            return char
+        decomposed = unicodedata.normalize("NFKD", char)
+        return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+    return "".join(map(fold_char, text.casefold().replace("ё", "е")))
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(fold(text))
+
+
+def stem(token: str) -> str:
+    """Strip a single case ending (and a latin stem vowel)."""
+
+    if "Ѐ" <= token[0] <= "ӿ":
+        for ending in CYRILLIC_ENDINGS:
+            if token.endswith(ending) and len(token) - len(ending) >= 3:
+                return token[: -len(ending)]
+        return token
+
+    for ending in LATIN_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 4:
+            token = token[: -len(ending)]
+            break
+    if token[-1] in VOWELS and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+class Gazetteer:
+    """Place names index keyed by token n-grams.
+
+    Every alias is stored both as its exact token tuple and as a tuple of
+    stems, lookups scan message n-grams (longest first) against the exact
+    index and resort to stems only when nothing matched exactly.
+    """
+
+    def __init__(self, places: list[tuple[Place, list[str]]]) -> Self:
+        self.places = [place for place, _ in places]
+        self.exact = defaultdict(set)
+        self.stems = defaultdict(set)
+
+        for index, (place, aliases) in enumerate(places):
+            for alias in [place.name, *aliases]:
+                tokens = tuple(tokenize(alias))
+                self.exact[tokens].add(index)
+                self.stems[tuple(map(stem, tokens))].add(index)
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_PATH) -> Self:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        cities = [
+            (Place(name, f"{name},{code}"), aliases)
+            for name, code, aliases in data["cities"]
+        ]
+        countries = [
+            (Place(name, capital, is_country=True), aliases)
+            for name, capital, aliases in data["countries"]
+        ]
+        return cls(cities + countries)
+
+    def _scan(self, tokens: list[str], index: dict, key) -> set[int]:
+        found = set()
+        i = 0
+        while i < len(tokens):
+            for n in range(min(MAX_NGRAM, len(tokens) - i), 0, -1):
+                if matches := index.get(tuple(map(key, tokens[i : i + n]))):
+                    found |= matches
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def find(self, text: str) -> list[Place]:
+        """Places mentioned in text; countries of mentioned cities are omitted."""
+
+        tokens = tokenize(text)
+        found = self._scan(tokens, self.exact, lambda t: t) or self._scan(
+            tokens, self.stems, stem
+        )
+        places = [self.places[i] for i in sorted(found)]
+        cities = {place.country_code for place in places if not place.is_country}
+        return [
+            place
+            for place in places
+            if not place.is_country or place.country_code not in cities
+        ]
+
+    def locate(self, text: str) -> Place | None:
+        """The only place mentioned in text, `None` if there are none or several."""
+
+        places = self.find(text)
+        return places[0] if len(places) == 1 else None
+
+
+@functools.lru_cache(maxsize=None)
+def gazetteer() -> Gazetteer:
+    """Shared gazetteer (loaded on first use)."""
+
+    return Gazetteer.load()
@@ -1,35 +1,115 @@
+import asyncio
+import logging
 import os
+import random
+import re
+import threading
+import time
 from abc import ABCMeta, abstractmethod
 from datetime import datetime as dt, timedelta
 from string import ascii_letters
-from typing import Self
+from typing import AsyncIterator, Awaitable, Callable, Self
 
+import aiohttp
 import openai
 import requests
 from yarl import URL
 
 from .ah import NORDNAAR_AH_SCRAPER as AH
-from .db import GPTChatHistory, GPTRoleSetting
+from .cache import MISSING, TTLCache
+from .db import GPTChatHistory, GPTModelSetting, GPTRoleSetting
 from .exceptions import (
     DocumentValidationError,
     ServiceUnavailable,
     ValidationError,
 )
+from .functions import normalize_query
+from .gazetteer import gazetteer
+from .metrics import GPT_METRICS, CompletionMetrics, CompletionStats
+from .scheduler import FairScheduler
+from .tokens import ContextWindow, build_context, count_tokens
 from .misc import (
     Singleton,
     Weather,
 )
+from .utils import APP_NAME
+
+
+LOG = logging.getLogger(APP_NAME)
 
 
 MAX_TOKENS = 1000
 """Maximum tokens per completion."""
 
+TOKEN_BUDGET = 3000
+"""Maximum tokens sent per request (role description, history and prompt)."""
+
+CONTEXT_DEADLINES = {
+    "role": 2,
+    "history": 3,
+    "intents": 5,
+}
+"""Seconds each (concurrent) request context assembly step may take."""
+
+ROLE_CACHE_SIZE = 1024
+ROLE_CACHE_TTL = 10 * 60
+"""Role descriptions cache size and entry lifetime (seconds)."""
+
+CACHE_SIZE = 1024
+CACHE_TTL = 60 * 60
+"""Stateless (owner-less) completion cache size and entry lifetime (seconds)."""
+
 MODEL_3_5_TURBO = "gpt-3.5-turbo"
 MODEL_4_O = "gpt-4o"
 MODEL_4_O_MINI = "gpt-4o-mini"
 MODEL_DEFAULT = MODEL_4_O_MINI
 """Default model used for completions."""
 
+MODELS = [MODEL_4_O, MODEL_4_O_MINI, MODEL_3_5_TURBO]
+"""Models available for routing and per-owner overrides."""
+
+MODEL_STRONG = MODEL_4_O
+"""Model for complex prompts."""
+
+MODELS_FAST = [MODEL_4_O_MINI, MODEL_3_5_TURBO]
+"""Models competing (by recent latency) for extraction requests."""
+
+PURPOSE_CHAT = "chat"
+PURPOSE_EXTRACTION = "extraction"
+"""Request purposes considered by model routing."""
+PURPOSE_SUMMARY = "summary"
+"""Purpose of history compaction requests (metrics only, not routed)."""
+
+COMPLEX_PROMPT_TOKENS = 400
+"""Prompts at least this long are considered complex."""
+
+COMPLEX_MIN_TOKENS = 8
+"""Prompts shorter than this are never considered complex ("why?")."""
+
+COMPLEXITY_PATTERN = re.compile(
+    r"```|\b(explain|why|how does|prove|compare|analy[sz]e|step by step|debug"
+    r"|refactor|calculate|derive|объясни|почему|сравни|докажи|проанализируй"
+    r"|посчитай|miks|selgita|võrdle)",
+    re.IGNORECASE,
+)
+"""Hints of prompts deserving the strong model (reasoning, code)."""
+
+STRONG_MAX_LATENCY = 20
+"""Recent median seconds above which strong model is skipped."""
+
+MODEL_LATENCY_WINDOW = 15 * 60
+"""Seconds of completion history considered for model latency."""
+
+MODEL_MIN_SAMPLES = 5
+"""Recent completions needed before fast model's latency is compared."""
+
+MODEL_EXPLORE_RATE = 0.05
+"""Share of extraction requests trying fast models lacking recent completions."""
+
+MODEL_CACHE_SIZE = 1024
+MODEL_CACHE_TTL = 10 * 60
+"""Per-owner model overrides cache size and entry lifetime (seconds)."""
+
 TEMPERATURE_DEFAULT = 0.3
 """Default temperature."""
 
@@ -71,20 +151,77 @@ MESSAGE_ROLE_TYPES = [
 EXPIRATION_DELTA = timedelta(days=1)
 """Default delta to consider GPT interaction as expired."""
 
+SUMMARY_KEEP_RAW = 6
+"""Newest interactions never condensed into running summary."""
+
+SUMMARY_MIN_BATCH = 4
+"""Minimum amount of interactions worth condensing at once."""
+
+SUMMARY_MAX_TOKENS = 300
+"""Maximum running summary length."""
+
+SUMMARY_INTERVAL = 10 * 60
+"""Seconds between history compaction passes."""
+
+SUMMARY_INSTRUCTIONS = """\
+You maintain a running summary of a chat between a user and an assistant.
+Merge the existing summary with the new messages into a single concise
+summary: facts about the user, names, preferences, decisions and open
+questions. Drop small talk. Reply with the summary only, in the language
+of the conversation, under 200 words.
+"""
+"""System message for history compaction requests."""
+
 RASA_PROVIDER_URL_ENV = "rasa_provider"
 """Rasa hostname."""
 
+INTENT_KEYWORDS = {
+    "query_weather": [
+        # en
+        "weather", "forecast", "temperature", "degree", "rain", "snow", "sunny",
+        "wind", "storm", "cloud", "umbrella", "cold", "hot", "warm", "freez",
+        "humid", "celsius",
+        # ru
+        "погод", "прогноз", "температур", "градус", "дожд", "снег",
+        "снеж", "солн", "ветр", "ветер", "ветрен", "гроз", "облач", "зонт",
+        "холод", "жар", "тепл", "мороз", "влажн",
+        # et
+        "ilm", "prognoos", "temperatuur", "kraad", "vihm", "sajab", "lumi",
+        "lund", "päike", "tuul", "torm", "pilv", "vihmavari", "külm", "soe",
+        "sooja", "palav", "pakane",
+    ],
+    "query_ah": [
+        "price", "cost", "worth", "auction", "ah",
+        "цен", "стоит", "стоимост", "аукцион", "ах",
+        "hind", "maksab", "oksjon",
+    ],
+}  # fmt: skip
+"""Word prefixes, at least one of which a message needs to mention to be a
+candidate for the intent; messages without any are not sent to intent provider."""
+
+INTENT_CACHE_SIZE = 4096
+INTENT_CACHE_TTL = 6 * 60 * 60
+"""Intent provider results cache size and entry lifetime (seconds)."""
+
 
 class IntentProvider(metaclass=ABCMeta):
     @abstractmethod
     def get_intent(self, text: str) -> str:
         return NotImplemented
 
+    async def aget_intent(self, text: str) -> str:
+        """Non-blocking `get_intent` (runs in a worker thread unless overridden)."""
+
+        return await asyncio.to_thread(self.get_intent, text)
+
 
 class RasaLocal(IntentProvider):
     MIN_CONFIDENCE = 0.85
     """Intent determination certainty % cut-off."""
 
+    TIMEOUT = 5
+    """Seconds to wait for intent parsing."""
+
     @property
     def text_parse_url(self):
         return self.url / "model/parse"
@@ -108,18 +245,79 @@ class RasaLocal(IntentProvider):
             "entities": data["entities"],
         }
 
+    async def aget_intent(self, text: str) -> str:
+        timeout = aiohttp.ClientTimeout(total=self.TIMEOUT)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(
+                    str(self.text_parse_url), json={"text": text}
+                ) as response:
+                    if not response.ok:
+                        raise ServiceUnavailable()
+                    data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raise ServiceUnavailable()
+
+        return {
+            "intent": data["intent"],
+            "entities": data["entities"],
+        }
+
 
 class IntentManager:
+    CACHE = TTLCache(maxsize=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL)
+    """Intent names by normalized message text."""
+
     def __init__(self, intent_engine: IntentProvider) -> Self:
         self.intent_provider = intent_engine
         self.intents = {
             # "query_ah": lambda text: AH.fetch_prices(text, format=True),
             "query_weather": self.query_weather,
         }
+        self.prefilter = self.compile_prefilter(self.intents)
+
+    @staticmethod
+    def compile_prefilter(intents: dict) -> re.Pattern:
+        """Pattern matching messages that may express any of the intents."""
+
+        keywords = sorted(
+            {keyword for name in intents for keyword in INTENT_KEYWORDS.get(name, [])},
+            key=len,
+            reverse=True,
+        )
+        if not keywords:
+            return re.compile(r"(?!)")
+        return re.compile(
+            r"\b(?:{})".format("|".join(map(re.escape, keywords))), re.IGNORECASE
+        )
+
+    def is_candidate(self, text: str) -> bool:
+        """Cheap check whether text may have a handled intent at all."""
+
+        return self.prefilter.search(text) is not None
+
+    def get_intent(self, text: str) -> str:
+        """Intent name as determined by intent provider (cached)."""
+
+        key = normalize_query(text)
+        if (intent := self.CACHE.get(key)) is None:
+            intent = self.intent_provider.get_intent(text)["intent"]["name"]
+            self.CACHE.set(key, intent)
+        return intent
+
+    async def aget_intent(self, text: str) -> str:
+        key = normalize_query(text)
+        if (intent := self.CACHE.get(key)) is None:
+            intent = (await self.intent_provider.aget_intent(text))["intent"]["name"]
+            self.CACHE.set(key, intent)
+        return intent
 
     def handle_prompt(self, text):
+        if not self.is_candidate(text):
+            return None
+
         try:
-            intent = self.intent_provider.get_intent(text)["intent"]["name"]
+            intent = self.get_intent(text)
         except ServiceUnavailable:
             return None
 
@@ -128,19 +326,44 @@ class IntentManager:
 
         return self.intents[intent](text)
 
+    async def ahandle_prompt(self, text):
+        """Non-blocking `handle_prompt` (intent handlers run in a worker thread)."""
+
+        if not self.is_candidate(text):
+            return None
+
+        try:
+            intent = await self.aget_intent(text)
+        except ServiceUnavailable:
+            return None
+
+        if intent not in self.intents:
+            return None
+
+        return await asyncio.to_thread(self.intents[intent], text)
+
     @staticmethod
-    def query_weather(text):
-        print(f"DEBUG (weather intent): {text}")
+    def extract_location(text):
+        """Location mentioned in text, asking GPT only if gazetteer can't tell."""
+
+        if place := gazetteer().locate(text):
+            return place.query
+
         location_raw = Completion().request(
             "Analyze the following message, if it contains a location "
             "(city, country, etc), return it as a single word. If none found, "
-            f"reply with “none”: MESSAGE: {text}"
+            f"reply with “none”: MESSAGE: {text}",
+            purpose=PURPOSE_EXTRACTION,
         )
         location = "".join(
             c for c in location_raw.lower().strip() if c in ascii_letters + " "
         )
+        return None if location == "none" else location
 
-        if location == "none":
+    @staticmethod
+    def query_weather(text):
+        print(f"DEBUG (weather intent): {text}")
+        if not (location := IntentManager.extract_location(text)):
             return None
 
         return Weather().query_weather(location)
@@ -149,7 +372,8 @@ class IntentManager:
     def query_ah(text):
         item_raw = Completion().request(
             "Analyze the following message, if it contains an item name (or item link), "
-            f"return it, but only the name. If none found, reply with “none”: MESSAGE: {text}"
+            f"return it, but only the name. If none found, reply with “none”: MESSAGE: {text}",
+            purpose=PURPOSE_EXTRACTION,
         )
         item = "".join(c for c in item_raw.lower().strip() if c in ascii_letters + " ")
 
@@ -161,14 +385,97 @@ class IntentManager:
         except:
             pass
 
-# TODO: fetch/show billing/usage
+
+class ModelRouter:
+    """Picks completion model per request.
+
+    Extraction requests go to the fast model with the lowest recent latency,
+    complex chat prompts (long or hinting at reasoning/code) to the strong
+    model unless it has been slow lately, anything else to the default model.
+    """
+
+    def __init__(
+        self,
+        default: str = MODEL_DEFAULT,
+        strong: str = MODEL_STRONG,
+        fast: list[str] = MODELS_FAST,
+        metrics: CompletionMetrics = GPT_METRICS,
+        explore_rate: float = MODEL_EXPLORE_RATE,
+        rng: random.Random = None,
+    ) -> Self:
+        self.default = default
+        self.strong = strong
+        self.fast = fast
+        self.metrics = metrics
+        self.explore_rate = explore_rate
+        self.rng = rng or random.Random()
+
+    def is_complex(self, prompt: str) -> bool:
+        tokens = count_tokens(prompt, self.default)
+        if tokens >= COMPLEX_PROMPT_TOKENS:
+            return True
+        return tokens >= COMPLEX_MIN_TOKENS and bool(COMPLEXITY_PATTERN.search(prompt))
+
+    def latency(self, model: str, purpose: str) -> float | None:
+        return self.metrics.model_latency(model, purpose, MODEL_LATENCY_WINDOW)
+
+    def fastest(self, purpose: str) -> str:
+        """Fast model with the lowest recent latency.
+
+        Models with fewer than `MODEL_MIN_SAMPLES` completions within the
+        latency window (unused or aged out) only get `explore_rate` share of
+        requests, the rest stick to the best known (or most used) model, so
+        requests don't alternate between models and split their prompt caches.
+        """
+
+        samples = {
+            model: self.metrics.model_samples(model, purpose, MODEL_LATENCY_WINDOW)
+            for model in self.fast
+        }
+        known = [model for model in self.fast if samples[model] >= MODEL_MIN_SAMPLES]
+        unknown = [model for model in self.fast if model not in known]
+
+        if unknown and self.rng.random() < self.explore_rate:
+            return self.rng.choice(unknown)
+        if not known:
+            return max(self.fast, key=samples.get)
+        return min(known, key=lambda model: self.latency(model, purpose))
+
+    def route(self, prompt: str, purpose: str = PURPOSE_CHAT) -> str:
+        if purpose == PURPOSE_EXTRACTION:
+            return self.fastest(purpose)
+
+        if self.is_complex(prompt):
+            latency = self.latency(self.strong, purpose)
+            if latency is None or latency <= STRONG_MAX_LATENCY:
+                return self.strong
+            LOG.info(f"Model '{self.strong}' is slow lately ({latency:.1f}s), skipping")
+
+        return self.default
+
+
 class Completion(Singleton):
     """GPT interation model."""
 
+    CACHE = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+    """Replies to stateless requests by model, temperature and messages."""
+
+    ROLES = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+    """Role descriptions (`None` for default role) by owner ID."""
+
+    MODEL_OVERRIDES = TTLCache(maxsize=MODEL_CACHE_SIZE, ttl=MODEL_CACHE_TTL)
+    """Owners' forced models (`None` for routed) by owner ID."""
+
+    SCHEDULER = FairScheduler()
+    """Shared fair queue and rate budget for asynchronous requests."""
+
     def __init__(self) -> None:
         openai.api_key = os.environ["openai_token"]
         self.model = MODEL_DEFAULT
+        """Model used for token counting and summaries (requests are routed)."""
+        self.router = ModelRouter(default=self.model)
         self.max_tokens = MAX_TOKENS
+        self.token_budget = TOKEN_BUDGET
         self.temperature = TEMPERATURE_DEFAULT
         self.intent_manager = IntentManager(intent_engine=RasaLocal())
 
@@ -189,8 +496,12 @@ class Completion(Singleton):
     def get_role(self, owner_id: str) -> str:
         """Return a GPT role description for specific owner ID."""
 
-        setting = GPTRoleSetting.get(owner_id)
-        return setting.role_description if setting else None
+        role_description = self.ROLES.get(owner_id, MISSING)
+        if role_description is MISSING:
+            setting = GPTRoleSetting.get(owner_id)
+            role_description = setting.role_description if setting else None
+            self.ROLES.set(owner_id, role_description)
+        return role_description
 
     def set_role(self, owner_id: str, role_description: str) -> None:
         """Update GPT role description for specific owner ID."""
@@ -204,45 +515,513 @@ class Completion(Singleton):
                 f"{ROLE_DESCRIPTION_MAX_LENGTH} characters long!"
             )
 
+        self.ROLES.pop(owner_id)
         GPTRoleSetting.set(owner_id, role_description)
+        self.ROLES.set(owner_id, role_description)
 
     def reset_role(self, owner_id):
         """Delete custom role description for specific owner ID."""
 
-        setting = GPTRoleSetting.get(owner_id)
-        if setting:
-            setting.delete()
+        self.ROLES.pop(owner_id)
+        GPTRoleSetting.remove(owner_id)
+        self.ROLES.set(owner_id, None)
 
-    def request(
+    def get_model_override(self, owner_id: str) -> str | None:
+        """Model forced for specific owner ID (`None` if routed)."""
+
+        model = self.MODEL_OVERRIDES.get(owner_id, MISSING)
+        if model is MISSING:
+            setting = GPTModelSetting.get(owner_id)
+            model = setting.model if setting else None
+            self.MODEL_OVERRIDES.set(owner_id, model)
+        return model
+
+    def set_model_override(self, owner_id: str, model: str | None) -> None:
+        """Force model for specific owner ID (`None` restores routing)."""
+
+        if model is not None and model not in MODELS:
+            raise ValidationError(f"Unknown model: {model} (supported: {MODELS})")
+
+        self.MODEL_OVERRIDES.pop(owner_id)
+        if model is None:
+            GPTModelSetting.remove(owner_id)
+        else:
+            GPTModelSetting.set(owner_id, model)
+        self.MODEL_OVERRIDES.set(owner_id, model)
+
+    def select_model(
+        self, prompt: str, purpose: str = PURPOSE_CHAT, owner_id: str = None
+    ) -> str:
+        """Owner's model override or the routed one."""
+
+        if owner_id and (model := self.get_model_override(owner_id)):
+            return model
+        return self.router.route(prompt, purpose)
+
+    async def aselect_model(
+        self, prompt: str, purpose: str = PURPOSE_CHAT, owner_id: str = None
+    ) -> str:
+        """Non-blocking `select_model` (override lookup may hit database)."""
+
+        if owner_id and self.MODEL_OVERRIDES.get(owner_id, MISSING) is MISSING:
+            await asyncio.to_thread(self.get_model_override, owner_id)
+        return self.select_model(prompt, purpose, owner_id)
+
+    def compose_messages(
+        self,
+        role_description: str,
+        history: list[dict],
+        prompt: str,
+        summary: str = None,
+    ) -> ContextWindow:
+        """Fit role description, newest history and prompt into token budget."""
+
+        if summary:
+            role_description += f"\n\nSUMMARY OF EARLIER CONVERSATION:\n{summary}"
+        window = build_context(
+            self.message("system", role_description),
+            history,
+            self.message("user", prompt),
+            self.model,
+            self.token_budget,
+        )
+        LOG.info(
+            f"GPT request: {window.tokens} tokens, {len(window.messages)} messages"
+            f" ({window.history_dropped} history messages over budget)"
+        )
+        return window
+
+    def build_messages(
         self,
         prompt: str,
         owner_id: str = None,
         use_history: bool = False,
-        history_limit: int = 2,
+        history_limit: int = None,
         handle_intents: bool = False,
-    ) -> str:
-        """Make request to selected GPT model."""
+    ) -> tuple[ContextWindow, str]:
+        """Assemble request messages, returns them along with final prompt.
+
+        History is limited by token budget, `history_limit` additionally caps
+        the amount of past interactions. Interactions condensed into running
+        summary are represented by the summary (in system message) instead.
+        """
 
+        role_description, history, summary = ROLE_DEFAULT, [], None
+        timings = {}
         if owner_id:
             role_description = self.get_role(owner_id) or ROLE_DEFAULT
-            messages = [self.message("system", role_description)]
             if use_history:
-                previous_messages = GPTChatHistory.fetch(
+                started = time.monotonic()
+                summary, history = GPTChatHistory.fetch_with_summary(
                     owner_id, after_ts=dt.now() - EXPIRATION_DELTA
                 )
-                messages.extend(previous_messages[-history_limit * 2 :])
-        else:
-            messages = [self.message("system", ROLE_DEFAULT)]
+                timings["history"] = time.monotonic() - started
+                if history_limit:
+                    history = history[-history_limit * 2 :]
 
         if handle_intents:
-            if context := self.intent_manager.handle_prompt(prompt):
+            started = time.monotonic()
+            context = self.intent_manager.handle_prompt(prompt)
+            timings["intents"] = time.monotonic() - started
+            if context:
                 prompt = f"{prompt}\n\nRELATED DATA:\n{context}"
 
-        messages.append(self.message("user", prompt))
-        reply = openai.ChatCompletion.create(model=self.model, messages=messages)
+        window = self.compose_messages(role_description, history, prompt, summary)
+        window.timings = timings
+        return window, prompt
+
+    async def abuild_messages(
+        self,
+        prompt: str,
+        owner_id: str = None,
+        use_history: bool = False,
+        history_limit: int = None,
+        handle_intents: bool = False,
+    ) -> tuple[ContextWindow, str]:
+        """Non-blocking `build_messages`.
+
+        Role lookup, history fetch and intent handling run concurrently, each
+        within its `CONTEXT_DEADLINES` entry; a step running late is left out
+        (default role, no history, no related data) instead of holding up the
+        completion.
+        """
+
+        async def role():
+            return await asyncio.to_thread(self.get_role, owner_id)
+
+        async def history():
+            return await asyncio.to_thread(
+                GPTChatHistory.fetch_with_summary,
+                owner_id,
+                after_ts=dt.now() - EXPIRATION_DELTA,
+            )
+
+        async def skip(default):
+            return default
+
+        timings = {}
+        role_description, (summary, history), context = await asyncio.gather(
+            self.deadline("role", role(), None, timings) if owner_id else skip(None),
+            (
+                self.deadline("history", history(), (None, []), timings)
+                if owner_id and use_history
+                else skip((None, []))
+            ),
+            (
+                self.deadline(
+                    "intents",
+                    self.intent_manager.ahandle_prompt(prompt),
+                    None,
+                    timings,
+                )
+                if handle_intents
+                else skip(None)
+            ),
+        )
+
+        if history_limit:
+            history = history[-history_limit * 2 :]
+        if context:
+            prompt = f"{prompt}\n\nRELATED DATA:\n{context}"
+
+        window = self.compose_messages(
+            role_description or ROLE_DEFAULT, history, prompt, summary
+        )
+        window.timings = timings
+        return window, prompt
+
+    @staticmethod
+    async def deadline(step: str, awaitable, default, timings: dict = None):
+        """Await context assembly step, falling back to default once late.
+
+        Step duration is stored into `timings` (if provided).
+        """
+
+        timeout = CONTEXT_DEADLINES[step]
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            LOG.warning(f"GPT context step '{step}' exceeded {timeout}s, skipping")
+            return default
+        finally:
+            if timings is not None:
+                timings[step] = time.monotonic() - started
+
+    def cache_key(
+        self,
+        prompt: str,
+        model: str,
+        owner_id: str = None,
+        handle_intents: bool = False,
+    ) -> tuple:
+        """Cache key for deterministic stateless requests (`None` otherwise).
+
+        Stateless requests have default role and no history, so the raw prompt
+        and settings are enough to look replies up before messages are built.
+        Requests with an owner or intent handling (related data such as weather
+        goes stale sooner than cached replies) are not cached.
+        """
+
+        if owner_id or handle_intents:
+            return None
+        return (model, self.temperature, prompt)
+
+    def request(
+        self,
+        prompt: str,
+        owner_id: str = None,
+        use_history: bool = False,
+        history_limit: int = None,
+        handle_intents: bool = False,
+        purpose: str = PURPOSE_CHAT,
+    ) -> str:
+        """Make request to GPT model selected for prompt, purpose and owner."""
+
+        model = self.select_model(prompt, purpose, owner_id)
+        key = self.cache_key(prompt, model, owner_id, handle_intents)
+        if key and (cached := self.CACHE.get(key)) is not None:
+            return cached
+
+        window, prompt = self.build_messages(
+            prompt, owner_id, use_history, history_limit, handle_intents
+        )
+
+        started = time.monotonic()
+        reply = openai.ChatCompletion.create(model=model, messages=window.messages)
         assistant_msg = reply["choices"][0]["message"]["content"]
+        self.record_completion(
+            model, purpose, owner_id, window, started, assistant_msg, reply.get("usage")
+        )
 
         if owner_id:
             GPTChatHistory.store(owner_id, prompt, assistant_msg)
+        elif key:
+            self.CACHE.set(key, assistant_msg)
+
+        return assistant_msg
+
+    async def arequest(
+        self,
+        prompt: str,
+        owner_id: str = None,
+        use_history: bool = False,
+        history_limit: int = None,
+        handle_intents: bool = False,
+        on_queued: Callable[[], Awaitable] = None,
+        purpose: str = PURPOSE_CHAT,
+    ) -> str:
+        """Non-blocking `request`.
+
+        Requests wait for their turn in `SCHEDULER`, `on_queued` is awaited
+        when the request can't be started right away.
+        """
+
+        model = await self.aselect_model(prompt, purpose, owner_id)
+        key = self.cache_key(prompt, model, owner_id, handle_intents)
+        if key and (cached := self.CACHE.get(key)) is not None:
+            return cached
+
+        window, prompt = await self.abuild_messages(
+            prompt, owner_id, use_history, history_limit, handle_intents
+        )
+
+        async with self.SCHEDULER.slot(
+            owner_id, window.tokens + self.max_tokens, on_queued
+        ) as ticket:
+            started = time.monotonic()
+            reply = await openai.ChatCompletion.acreate(
+                model=model, messages=window.messages, max_tokens=self.max_tokens
+            )
+            assistant_msg = reply["choices"][0]["message"]["content"]
+            ticket.record(
+                self.record_completion(
+                    model,
+                    purpose,
+                    owner_id,
+                    window,
+                    started,
+                    assistant_msg,
+                    reply.get("usage"),
+                )
+            )
+
+        if owner_id:
+            await asyncio.to_thread(
+                GPTChatHistory.store, owner_id, prompt, assistant_msg
+            )
+        elif key:
+            self.CACHE.set(key, assistant_msg)
 
         return assistant_msg
+
+    async def astream(
+        self,
+        prompt: str,
+        owner_id: str = None,
+        use_history: bool = False,
+        history_limit: int = None,
+        handle_intents: bool = False,
+        on_queued: Callable[[], Awaitable] = None,
+        purpose: str = PURPOSE_CHAT,
+    ) -> AsyncIterator[str]:
+        """Make streamed request to selected GPT model, yielding reply chunks.
+
+        Scheduled like `arequest`; chat history is stored only once the whole
+        reply has been received.
+        """
+
+        model = await self.aselect_model(prompt, purpose, owner_id)
+        window, prompt = await self.abuild_messages(
+            prompt, owner_id, use_history, history_limit, handle_intents
+        )
+        chunks = []
+        async with self.SCHEDULER.slot(
+            owner_id, window.tokens + self.max_tokens, on_queued
+        ) as ticket:
+            started = time.monotonic()
+            first_token = None
+            try:
+                async for event in await openai.ChatCompletion.acreate(
+                    model=model,
+                    messages=window.messages,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                ):
+                    if content := event["choices"][0]["delta"].get("content"):
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                        chunks.append(content)
+                        yield content
+            finally:
+                ticket.record(
+                    self.record_completion(
+                        model,
+                        purpose,
+                        owner_id,
+                        window,
+                        started,
+                        "".join(chunks),
+                        first_token=first_token,
+                    )
+                )
+
+        if owner_id:
+            await asyncio.to_thread(
+                GPTChatHistory.store, owner_id, prompt, "".join(chunks)
+            )
+
+    def record_completion(
+        self,
+        model: str,
+        purpose: str,
+        owner_id: str,
+        window: ContextWindow,
+        started: float,
+        reply: str,
+        usage: dict = None,
+        first_token: float = None,
+    ) -> int:
+        """Record completion metrics, returns total tokens used.
+
+        Token counts reported in `usage` take precedence over local estimates
+        (streamed replies carry no usage).
+        """
+
+        if usage:
+            prompt_tokens = usage["prompt_tokens"]
+            completion_tokens = usage["completion_tokens"]
+        else:
+            prompt_tokens = window.tokens
+            completion_tokens = count_tokens(reply, model)
+
+        GPT_METRICS.record(
+            CompletionStats(
+                model=model,
+                owner_id=owner_id,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                wall_time=time.monotonic() - started,
+                first_token=first_token,
+                timings=window.timings,
+                purpose=purpose,
+            )
+        )
+        return prompt_tokens + completion_tokens
+
+    def summarize(self, summary: str, interactions: list, owner_id: str = None) -> str:
+        """Condense interactions into (existing) running summary.
+
+        Usage is recorded under owner's metrics and charged to `SCHEDULER`
+        budgets shared with chat requests.
+        """
+
+        conversation = "\n".join(
+            f"user: {i.user_message}\nassistant: {i.system_reply}"
+            for i in interactions
+        )
+        window = build_context(
+            self.message(MESSAGE_ROLE_SYSTEM, SUMMARY_INSTRUCTIONS),
+            [],
+            self.message(
+                MESSAGE_ROLE_USER,
+                f"EXISTING SUMMARY:\n{summary or '-'}\n\n"
+                f"NEW MESSAGES:\n{conversation}",
+            ),
+            self.model,
+            self.token_budget,
+        )
+        started = time.monotonic()
+        reply = openai.ChatCompletion.create(
+            model=self.model,
+            messages=window.messages,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            temperature=0,
+        )
+        new_summary = reply["choices"][0]["message"]["content"].strip()
+        self.SCHEDULER.charge(
+            self.record_completion(
+                self.model,
+                PURPOSE_SUMMARY,
+                owner_id,
+                window,
+                started,
+                new_summary,
+                reply.get("usage"),
+            )
+        )
+        return new_summary
+
+
+class HistoryCompactor:
+    """Background thread condensing older chat interactions into summaries.
+
+    Keeps the newest `keep_raw` interactions of every conversation verbatim,
+    older ones are merged into the stored running summary once at least
+    `min_batch` of them have accumulated.
+    """
+
+    def __init__(
+        self,
+        interval: float = SUMMARY_INTERVAL,
+        keep_raw: int = SUMMARY_KEEP_RAW,
+        min_batch: int = SUMMARY_MIN_BATCH,
+    ) -> Self:
+        self.interval = interval
+        self.keep_raw = keep_raw
+        self.min_batch = min_batch
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start compaction thread (no-op if already running)."""
+
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="history-compactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.compact_all()
+            except Exception as e:
+                LOG.error(f"Error during chat history compaction: {e}")
+
+    def compact(self, history: GPTChatHistory) -> bool:
+        """Condense older interactions of a single conversation if due."""
+
+        pending = history.unsummarized()[: -self.keep_raw or None]
+        if len(pending) < self.min_batch:
+            return False
+
+        summary = Completion().summarize(history.summary, pending, history.owner_id)
+        GPTChatHistory.store_summary(history.owner_id, summary, pending[-1].timestamp)
+        LOG.info(
+            f"Condensed {len(pending)} interactions of '{history.owner_id}' "
+            "into running summary"
+        )
+        return True
+
+    def compact_all(self) -> int:
+        """Single compaction pass over all conversations."""
+
+        return sum(self.compact(history) for history in GPTChatHistory.find_all())
+
+
+HISTORY_COMPACTOR = HistoryCompactor()
+"""Global chat history compactor (started by clients)."""
@@ -0,0 +1,382 @@
+"""Host, process and GPT completion metrics history."""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Self
+
+import numpy as np
+import psutil
+
+from .db import GPTUsage
+from .utils import APP_NAME
+
+
+LOG = logging.getLogger(APP_NAME)
+
+SAMPLING_INTERVAL = 5
+"""Seconds between host metrics samples."""
+
+HISTORY = 60 * 60
+"""Seconds of metrics history kept."""
+
+WINDOWS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+"""Aggregation windows reported by default."""
+
+COMPLETION_HISTORY = 4096
+"""GPT completions kept for latency percentiles."""
+
+USAGE_FLUSH_INTERVAL = 60
+"""Seconds between GPT usage counter flushes into database."""
+
+ANONYMOUS_OWNER = "-"
+"""Owner recorded for requests without one (stateless, extraction)."""
+
+
+class RingBuffer:
+    """Fixed-size history of timestamped float samples."""
+
+    def __init__(self, capacity: int) -> Self:
+        self.capacity = capacity
+        self.timestamps = np.full(capacity, -np.inf)
+        self.values = np.zeros(capacity)
+        self.index = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp: float, value: float) -> None:
+        with self._lock:
+            self.timestamps[self.index] = timestamp
+            self.values[self.index] = value
+            self.index = (self.index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    @property
+    def last(self) -> float:
+        """Most recent value (`nan` if empty)."""
+
+        with self._lock:
+            return self.values[self.index - 1] if self.count else np.nan
+
+    def window(self, seconds: float, now: float) -> np.ndarray:
+        """Values recorded within the last `seconds`."""
+
+        with self._lock:
+            return self.values[self.timestamps >= now - seconds].copy()
+
+    def stats(self, seconds: float, now: float) -> dict:
+        """min/avg/max/p95 over the last `seconds` (empty dict if no samples)."""
+
+        values = self.window(seconds, now)
+        if not len(values):
+            return {}
+        return {
+            "min": float(values.min()),
+            "avg": float(values.mean()),
+            "max": float(values.max()),
+            "p95": float(np.percentile(values, 95)),
+        }
+
+    def percentiles(self, seconds: float, now: float, q=(50, 95)) -> dict:
+        """Percentiles (`p50`, ...) and sample count over the last `seconds`."""
+
+        values = self.window(seconds, now)
+        if not len(values):
+            return {}
+        return {
+            **{f"p{p}": float(v) for p, v in zip(q, np.percentile(values, q))},
+            "count": len(values),
+        }
+
+
+class HostMetricsSampler:
+    """Background thread sampling host and own process resource usage."""
+
+    SERIES = {
+        "cpu": "CPU %",
+        "ram": "RAM %",
+        "swap": "swap %",
+        "disk": "disk %",
+        "proc_cpu": "peon CPU %",
+        "proc_rss": "peon RSS MB",
+    }
+    """Recorded series and their labels."""
+
+    PROCESS_SERIES = ["proc_cpu", "proc_rss"]
+    """Series describing bot process itself."""
+
+    def __init__(
+        self,
+        interval: float = SAMPLING_INTERVAL,
+        history: float = HISTORY,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.interval = interval
+        self.clock = clock
+        self.series = {
+            name: RingBuffer(int(history // interval) + 1) for name in self.SERIES
+        }
+        self.process = psutil.Process(os.getpid())
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start sampling thread (no-op if already running)."""
+
+        if self.running:
+            return
+
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="host-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                LOG.error(f"Error during host metrics sampling: {e}")
+
+    def sample(self) -> None:
+        """Record a single sample of every series."""
+
+        now = self.clock()
+        values = {
+            "cpu": psutil.cpu_percent(interval=None),
+            "ram": psutil.virtual_memory().percent,
+            "swap": psutil.swap_memory().percent,
+            "disk": psutil.disk_usage("/").percent,
+            "proc_cpu": self.process.cpu_percent(interval=None),
+            "proc_rss": self.process.memory_info().rss / 2**20,
+        }
+        for name, value in values.items():
+            self.series[name].append(now, value)
+
+    def has_data(self) -> bool:
+        return bool(self.series["cpu"].count)
+
+    def summary(self, windows: dict = WINDOWS, process: bool = False) -> str:
+        """Table with current value and min/avg/max/p95 per series and window."""
+
+        now = self.clock()
+        names = [n for n in self.SERIES if process or n not in self.PROCESS_SERIES]
+        lines = [f"{'':<12}{'now':>7}{'min':>7}{'avg':>7}{'max':>7}{'p95':>7}"]
+
+        for name in names:
+            buffer = self.series[name]
+            lines.append(f"{self.SERIES[name]:<12}{buffer.last:>7.1f}")
+            for label, seconds in windows.items():
+                if stats := buffer.stats(seconds, now):
+                    values = "".join(f"{value:>7.1f}" for value in stats.values())
+                    lines.append(f"  {label:<17}{values}")
+
+        return "\n".join(lines)
+
+
+HOST_METRICS = HostMetricsSampler()
+"""Global host metrics sampler (started by clients)."""
+
+
+@dataclass
+class CompletionStats:
+    """Measurements of a single GPT completion."""
+
+    model: str
+    owner_id: str | None
+    prompt_tokens: int
+    completion_tokens: int
+    wall_time: float
+    """Seconds from sending the request until the whole reply was received."""
+    first_token: float | None = None
+    """Seconds until the first streamed chunk (streamed replies only)."""
+    timings: dict[str, float] = field(default_factory=dict)
+    """Context assembly steps durations (history fetch, intents)."""
+    purpose: str = "chat"
+    """Request purpose (chat, extraction), completion latencies depend on it."""
+
+
+class CompletionMetrics:
+    """GPT completion latency history and per-owner usage counters.
+
+    Latencies and token counts of recent completions are kept in ring buffers
+    for percentiles, per owner/model usage is accumulated in memory and
+    periodically added to daily `GPTUsage` counters by a background thread.
+    """
+
+    SERIES = {
+        "wall": "total s",
+        "first_token": "1st token s",
+        "history": "history s",
+        "intents": "intents s",
+        "prompt_tokens": "prompt tok",
+        "completion_tokens": "reply tok",
+    }
+    """Recorded series and their labels."""
+
+    COUNTERS = ["requests", "prompt_tokens", "completion_tokens", "wall_time"]
+
+    def __init__(
+        self,
+        capacity: int = COMPLETION_HISTORY,
+        interval: float = USAGE_FLUSH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.interval = interval
+        self.clock = clock
+        self.series = {name: RingBuffer(capacity) for name in self.SERIES}
+        self.models = defaultdict(lambda: RingBuffer(capacity))
+        """Completion wall times per model and request purpose."""
+        self.pending = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start flushing thread (no-op if already running)."""
+
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="gpt-usage", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                LOG.error(f"Error during GPT usage flush: {e}")
+
+    def record(self, stats: CompletionStats) -> None:
+        now = self.clock()
+        values = {
+            "wall": stats.wall_time,
+            "first_token": stats.first_token,
+            "prompt_tokens": stats.prompt_tokens,
+            "completion_tokens": stats.completion_tokens,
+            **stats.timings,
+        }
+        for name, value in values.items():
+            if name in self.series and value is not None:
+                self.series[name].append(now, value)
+        self.models[stats.model, stats.purpose].append(now, stats.wall_time)
+
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        with self._lock:
+            counters = self.pending[day, stats.owner_id or ANONYMOUS_OWNER, stats.model]
+            counters["requests"] += 1
+            counters["prompt_tokens"] += stats.prompt_tokens
+            counters["completion_tokens"] += stats.completion_tokens
+            counters["wall_time"] += stats.wall_time
+
+    def model_latency(
+        self, model: str, purpose: str, seconds: float, q: int = 50
+    ) -> float | None:
+        """Percentile of model's recent completion wall time (`None` if unused)."""
+
+        if (model, purpose) not in self.models:
+            return None
+        stats = self.models[model, purpose].percentiles(seconds, self.clock(), q=(q,))
+        return stats.get(f"p{q}")
+
+    def model_samples(self, model: str, purpose: str, seconds: float) -> int:
+        """Amount of model's completions within the last `seconds`."""
+
+        if (model, purpose) not in self.models:
+            return 0
+        return len(self.models[model, purpose].window(seconds, self.clock()))
+
+    def flush(self) -> int:
+        """Add accumulated usage to database counters, returns amount of rows.
+
+        Rows failing to be written are kept for the next flush, the remaining
+        ones are still written (first error is raised afterwards).
+        """
+
+        with self._lock:
+            pending, self.pending = self.pending, defaultdict(
+                lambda: dict.fromkeys(self.COUNTERS, 0)
+            )
+
+        flushed, error = 0, None
+        for (day, owner_id, model), counters in pending.items():
+            try:
+                GPTUsage.add(day, owner_id, model, **counters)
+                flushed += 1
+            except Exception as e:
+                error = error or e
+                with self._lock:
+                    kept = self.pending[day, owner_id, model]
+                    for name, value in counters.items():
+                        kept[name] += value
+
+        if error is not None:
+            raise error
+        return flushed
+
+    def latency_summary(self, windows: dict = WINDOWS) -> str:
+        """Table with p50/p95 and sample count per series and window."""
+
+        now = self.clock()
+        lines = [f"{'':<19}{'p50':>8}{'p95':>8}{'n':>6}"]
+
+        for name, label in self.SERIES.items():
+            lines.append(label)
+            for window, seconds in windows.items():
+                if stats := self.series[name].percentiles(seconds, now):
+                    lines.append(
+                        f"  {window:<17}{stats['p50']:>8.2f}{stats['p95']:>8.2f}"
+                        f"{stats['count']:>6}"
+                    )
+
+        return "\n".join(lines)
+
+    def usage_summary(self, days: int = 1, limit: int = 10) -> str:
+        """Heaviest owners by tokens over the last `days` (including today)."""
+
+        self.flush()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = GPTUsage.totals(today - timedelta(days=days - 1), limit=limit)
+        lines = [f"{'owner':<20}{'req':>6}{'prompt':>9}{'reply':>8}{'avg s':>7}"]
+        for row in rows:
+            lines.append(
+                f"{row['_id']:<20}{row['requests']:>6}{row['prompt_tokens']:>9}"
+                f"{row['completion_tokens']:>8}"
+                f"{row['wall_time'] / max(row['requests'], 1):>7.2f}"
+            )
+        return "\n".join(lines)
+
+
+GPT_METRICS = CompletionMetrics()
+"""Global GPT completion metrics (flushing started by clients)."""
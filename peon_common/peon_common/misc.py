@@ -4,6 +4,7 @@ import os
 import requests
 from yarl import URL
 
+from peon_common.cache import MISSING, TTLCache
 from peon_common.utils import logger
 from peon_common.exceptions import LogicalError
 
@@ -11,6 +12,18 @@ from peon_common.exceptions import LogicalError
 LOG = logger()
 OPENWEATHER_TOKEN = "openweather_token"
 
+GEOCODING_TTL = 7 * 24 * 60 * 60
+"""Seconds geocoded locations are kept."""
+
+GEOCODING_MISS_TTL = 60 * 60
+"""Seconds unknown locations are remembered as such."""
+
+WEATHER_TTL = 5 * 60
+"""Seconds weather reports are reused for the same place."""
+
+COORDS_PRECISION = 2
+"""Decimal places coordinates are rounded to for weather caching (~1 km)."""
+
 
 class Singleton:
     _instances = {}
@@ -25,18 +38,62 @@ class Weather(Singleton):
     URL_COORDS = URL("http://api.openweathermap.org/geo/1.0/direct")
     URL_WEATHER = URL("http://api.openweathermap.org/data/2.5/weather")
 
+    LOCATIONS = TTLCache(maxsize=4096, ttl=GEOCODING_TTL)
+    """Coordinates (or `None` for unknown places) by normalized location."""
+
+    REPORTS = TTLCache(maxsize=1024, ttl=WEATHER_TTL)
+    """Formatted weather by rounded coordinates."""
+
     def __init__(self) -> None:
         self.api_key = os.environ[OPENWEATHER_TOKEN]
 
-    # TODO: caching
+    @staticmethod
+    def normalize_location(location: str) -> str:
+        return " ".join(location.split()).casefold()
+
+    def geocode(self, location: str) -> tuple[float, float] | None:
+        """Location coordinates rounded to `COORDS_PRECISION`, `None` if unknown."""
+
+        key = self.normalize_location(location)
+        coords = self.LOCATIONS.get(key, MISSING)
+        if coords is not MISSING:
+            return coords
+
+        response = requests.get(
+            self.URL_COORDS.with_query(
+                {"q": location.strip(), "limit": 1, "appid": self.api_key}
+            ),
+            timeout=5,
+        )
+        response.raise_for_status()
+        places = response.json()
+
+        if not places:
+            self.LOCATIONS.set(key, None, ttl=GEOCODING_MISS_TTL)
+            return None
+
+        coords = (
+            round(places[0]["lat"], COORDS_PRECISION),
+            round(places[0]["lon"], COORDS_PRECISION),
+        )
+        self.LOCATIONS.set(key, coords)
+        return coords
+
     def query_weather(self, location: str) -> dict:
-        if not location:
+        if not location or not location.strip():
             raise LogicalError()
 
         try:
+            coords = self.geocode(location)
+            if coords is None:
+                return {"location": location, "error_message": "city not found"}
+            if (formatted := self.REPORTS.get(coords)) is not None:
+                return dict(formatted)
+
+            lat, lon = coords
             response = requests.get(
                 self.URL_WEATHER.with_query(
-                    {"q": location.strip(), "appid": self.api_key}
+                    {"lat": lat, "lon": lon, "appid": self.api_key}
                 ),
                 timeout=5,
             )
@@ -73,6 +130,7 @@ class Weather(Singleton):
         if "snow" in data:
             formatted["snow"] = f"{data['snow']} (last x hours, mm)"
 
+        self.REPORTS.set(coords, dict(formatted))
         return formatted
 
     @staticmethod
@@ -0,0 +1,186 @@
+"""Morse code codec."""
+
+import re
+from typing import Iterable, Iterator, Self
+
+
+MORSE_CODE = {
+    "a": ".-",
+    "b": "-...",
+    "c": "-.-.",
+    "d": "-..",
+    "e": ".",
+    "f": "..-.",
+    "g": "--.",
+    "h": "....",
+    "i": "..",
+    "j": ".---",
+    "k": "-.-",
+    "l": ".-..",
+    "m": "--",
+    "n": "-.",
+    "o": "---",
+    "p": ".--.",
+    "q": "--.-",
+    "r": ".-.",
+    "s": "...",
+    "t": "-",
+    "u": "..-",
+    "v": "...-",
+    "w": ".--",
+    "x": "-..-",
+    "y": "-.--",
+    "z": "--..",
+    "1": ".----",
+    "2": "..---",
+    "3": "...--",
+    "4": "....-",
+    "5": ".....",
+    "6": "-....",
+    "7": "--...",
+    "8": "---..",
+    "9": "----.",
+    "0": "-----",
+    ",": "--..--",
+    ".": ".-.-.-",
+    "?": "..--..",
+    "/": "-..-.",
+    "-": "-....-",
+    "(": "-.--.",
+    ")": "-.--.-",
+    " ": " ",
+}
+"""Morse code dictionary."""
+
+PROSIGNS = {
+    "<ar>": ".-.-.",
+    "<as>": ".-...",
+    "<bt>": "-...-",
+    "<ct>": "-.-.-",
+    "<hh>": "........",
+    "<sk>": "...-.-",
+    "<sn>": "...-.",
+    "<sos>": "...---...",
+}
+"""Procedural signals, written as `<xx>` in plain text."""
+
+UNKNOWN = "�"
+"""Placeholder for morse sequences that could not be decoded."""
+
+SYMBOLS = frozenset(".- /")
+"""Characters morse code messages consist of."""
+
+
+class _EncodingTable(dict):
+    """`str.translate` table dropping characters it does not know."""
+
+    def __missing__(self, key):
+        return None
+
+
+class MorseCodec:
+    """Morse encoder/decoder working incrementally over chunked input.
+
+    Letters are separated by a single space and words by two or more
+    spaces (or a slash). Both directions process input chunk by chunk with
+    C-level string operations and carry only the unfinished tail (a partial
+    code, separator or prosign) over to the next chunk.
+    """
+
+    TOKENS = re.compile(r"[^\s/]+|[\s/]+")
+    """Codes and separators between them."""
+
+    def __init__(
+        self, table: dict = MORSE_CODE, prosigns: dict = PROSIGNS, unknown=UNKNOWN
+    ) -> Self:
+        self.table = dict(table)
+        self.prosigns = dict(prosigns)
+        self.unknown = unknown
+        self.reverse = {v: k for k, v in self.table.items() if v.strip()}
+
+        for sign, code in self.prosigns.items():
+            if code in self.reverse:
+                raise ValueError(f"Prosign {sign} clashes with '{self.reverse[code]}'")
+            self.reverse[code] = sign.upper()
+
+        self.encoding = _EncodingTable(
+            {ord(char): f"{code} " for char, code in self.table.items()}
+        )
+        self.prosign_max_len = max(map(len, self.prosigns), default=0)
+        self.prosign_pattern = re.compile(
+            "({})".format("|".join(map(re.escape, self.prosigns)))
+        )
+
+    @staticmethod
+    def is_morse(text: str) -> bool:
+        """Evaluate if provided text is morse code."""
+
+        chars = set(text)
+        return chars <= SYMBOLS and bool(chars & {".", "-"})
+
+    def _encode_chunk(self, text: str) -> str:
+        if not self.prosigns or "<" not in text:
+            return text.translate(self.encoding)
+
+        return "".join(
+            f"{self.prosigns[part]} " if index % 2 else part.translate(self.encoding)
+            for index, part in enumerate(self.prosign_pattern.split(text))
+        )
+
+    def encode(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Encode text chunks into morse, characters outside the table are skipped."""
+
+        carry = ""
+        started = False
+
+        for chunk in [chunks] if isinstance(chunks, str) else chunks:
+            buffer = carry + chunk.lower()
+            carry = ""
+            cut = buffer.rfind("<")
+            if (
+                cut != -1
+                and ">" not in buffer[cut:]
+                and len(buffer) - cut < self.prosign_max_len
+            ):
+                buffer, carry = buffer[:cut], buffer[cut:]
+
+            if encoded := self._encode_chunk(buffer):
+                yield f" {encoded[:-1]}" if started else encoded[:-1]
+                started = True
+
+        if carry and (encoded := self._encode_chunk(carry)):
+            yield f" {encoded[:-1]}" if started else encoded[:-1]
+
+    def decode(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Decode morse chunks into text, yielding decoded text per chunk."""
+
+        carry = ""
+        gap = False
+        started = False
+
+        def translate(parts):
+            nonlocal gap, started
+            decoded = []
+            for part in parts:
+                if part[0].isspace() or part[0] == "/":
+                    gap = len(part) > 1 or "/" in part
+                else:
+                    if gap and started:
+                        decoded.append(" ")
+                    decoded.append(self.reverse.get(part, self.unknown))
+                    gap = False
+                    started = True
+            return "".join(decoded)
+
+        for chunk in [chunks] if isinstance(chunks, str) else chunks:
+            parts = self.TOKENS.findall(carry + chunk)
+            carry = parts.pop() if parts else ""
+            if decoded := translate(parts):
+                yield decoded
+
+        if carry and (decoded := translate([carry])):
+            yield decoded
+
+
+MORSE = MorseCodec()
+"""Default morse codec."""
@@ -0,0 +1,196 @@
+"""Fair scheduling of rate limited upstream (GPT) requests."""
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Self
+
+from .utils import APP_NAME
+
+
+LOG = logging.getLogger(APP_NAME)
+
+MAX_CONCURRENT = 4
+"""Requests allowed to run at the same time."""
+
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+"""Upstream rate limits (shared by all owners)."""
+
+
+class TokenBucket:
+    """Rate limit bucket refilled continuously up to a minute's worth.
+
+    Consumption may exceed the current level; the debt delays later
+    requests until it is refilled. Safe to use from multiple threads.
+    """
+
+    def __init__(
+        self, per_minute: float, clock: Callable[[], float] = time.monotonic
+    ) -> Self:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.level = per_minute
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if right away)."""
+
+        with self._lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+
+class Ticket:
+    """A single scheduled request."""
+
+    def __init__(self, owner_id: Hashable, tokens: int, future: asyncio.Future) -> Self:
+        self.owner_id = owner_id
+        self.tokens = tokens
+        """Tokens reserved (estimate) until actual usage is recorded."""
+        self.used = None
+        self.future = future
+        self.granted = False
+
+    def record(self, tokens: int) -> None:
+        """Report tokens actually used by the request."""
+
+        self.used = tokens
+
+
+class FairScheduler:
+    """Round-robin scheduler over per-owner request queues.
+
+    At most `max_concurrent` requests run at once, owners take turns so a
+    single busy owner can't starve the others, and requests start only while
+    global requests/tokens per minute budgets allow. Token reservations are
+    corrected by usage recorded through `Ticket.record`.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = TOKENS_PER_MINUTE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Self:
+        self.max_concurrent = max_concurrent
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.queues: OrderedDict[Hashable, deque[Ticket]] = OrderedDict()
+        self.active = 0
+        self._timer = None
+
+    @property
+    def queued(self) -> int:
+        return sum(map(len, self.queues.values()))
+
+    def _dispatch(self) -> None:
+        while self.queues and self.active < self.max_concurrent:
+            owner_id, queue = next(iter(self.queues.items()))
+            ticket = queue[0]
+            if ticket.future.cancelled():
+                self._withdraw(ticket)
+                continue
+
+            wait = max(self.requests.delay(1), self.tokens.delay(ticket.tokens))
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(
+                        wait, self._wake
+                    )
+                return
+
+            self._withdraw(ticket)
+            if queue:
+                self.queues[owner_id] = queue
+            self.requests.consume(1)
+            self.tokens.consume(ticket.tokens)
+            self.active += 1
+            ticket.granted = True
+            ticket.future.set_result(None)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _withdraw(self, ticket: Ticket) -> None:
+        """Remove ticket from its owner's queue (owner goes to the back)."""
+
+        queue = self.queues.pop(ticket.owner_id, None)
+        if queue is None:
+            return
+        with contextlib.suppress(ValueError):
+            queue.remove(ticket)
+        if queue:
+            self.queues[ticket.owner_id] = queue
+
+    def _release(self, ticket: Ticket) -> None:
+        self.active -= 1
+        if ticket.used is not None:
+            self.tokens.consume(ticket.used - ticket.tokens)
+        self._dispatch()
+
+    def charge(self, tokens: int) -> None:
+        """Account for a request made outside of `slot` (any thread).
+
+        Its usage counts against the shared budgets, delaying queued requests.
+        """
+
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        owner_id: Hashable,
+        tokens: int,
+        on_queued: Callable[[], Awaitable] = None,
+    ) -> AsyncIterator[Ticket]:
+        """Wait for owner's turn and budget, then hold a concurrency slot.
+
+        - owner_id (hashable): queue the request belongs to
+        - tokens (int): estimated tokens the request will use
+        - on_queued (callable, optional): awaited when the request has to wait
+        """
+
+        ticket = Ticket(owner_id, tokens, asyncio.get_running_loop().create_future())
+        self.queues.setdefault(owner_id, deque()).append(ticket)
+        self._dispatch()
+
+        if not ticket.granted:
+            LOG.info(f"GPT request of '{owner_id}' queued ({self.queued} waiting)")
+            if on_queued:
+                try:
+                    await on_queued()
+                except Exception as e:
+                    LOG.warning(f"Error notifying about queued request: {e}")
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket.granted:
+                    self._release(ticket)
+                else:
+                    self._withdraw(ticket)
+                raise
+
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
@@ -0,0 +1,297 @@
+"""Local stand-ins for OpenAI chat completions and Rasa NLU HTTP APIs.
+
+Meant for tests and load testing of GPT request path without paying for (or
+depending on) real services: point `openai.api_base` (or `OPENAI_API_BASE`)
+and `rasa_provider` environment variable at the served URLs.
+
+Standalone usage: python -m peon_common.standins [--latency 0.5] [...]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Iterator, Self
+
+from aiohttp import web
+from yarl import URL
+
+from .tokens import REPLY_OVERHEAD, count_tokens, message_tokens
+
+
+REPLY_WORDS = (
+    "work work zug zug ready to serve something need doing me busy leave me "
+    "alone okie dokie be happy to why not i can do that"
+).split()
+"""Vocabulary of generated replies."""
+
+RASA_INTENTS = {
+    "query_weather": ["weather", "forecast", "погода", "погоду", "ilm"],
+    "query_ah": ["price", "cost", "цена", "стоит"],
+    "greet": ["hello", "hi", "привет"],
+}
+"""Keywords recognized by Rasa stand-in per intent."""
+
+RASA_FALLBACK_INTENT = "intent_fallback"
+
+
+class StandInStats:
+    """Request accounting shared by stand-ins."""
+
+    def __init__(self) -> Self:
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.active = 0
+        self.max_active = 0
+
+    @contextlib.contextmanager
+    def track(self) -> Iterator[None]:
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class OpenAIStandIn:
+    """OpenAI-compatible `/v1/chat/completions` endpoint (incl. streaming).
+
+    - latency (float): seconds before the first token
+    - token_delay (float): seconds between generated tokens
+    - reply_tokens (int): generated reply length (words)
+    - error_rate (float): share of requests failing with 500
+    - rate_limit_rate (float): share of requests rejected with 429
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        token_delay: float = 0.01,
+        reply_tokens: int = 40,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = None,
+    ) -> Self:
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.stats = StandInStats()
+        self.models = Counter()
+        """Requests per model."""
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        return app
+
+    def injected_error(self) -> web.Response | None:
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            status, kind = 429, "rate_limit_exceeded"
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status, kind = 500, "server_error"
+        else:
+            return None
+
+        self.stats.errors += 1
+        return web.json_response(
+            {"error": {"message": f"stand-in {kind}", "type": kind, "code": kind}},
+            status=status,
+        )
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        with self.stats.track():
+            body = await request.json()
+            await asyncio.sleep(self.latency)
+            if (error := self.injected_error()) is not None:
+                return error
+
+            model = body.get("model", "gpt-stand-in")
+            self.models[model] += 1
+            prompt_tokens = REPLY_OVERHEAD + sum(
+                message_tokens(message, model) for message in body["messages"]
+            )
+            words = [
+                self.random.choice(REPLY_WORDS) for _ in range(self.reply_tokens)
+            ]
+            words = [words[0], *(f" {word}" for word in words[1:])]
+            completion_tokens = count_tokens("".join(words), model)
+            self.stats.prompt_tokens += prompt_tokens
+            self.stats.completion_tokens += completion_tokens
+
+            completion_id = f"chatcmpl-{self.stats.requests}"
+            if body.get("stream"):
+                return await self.stream(request, completion_id, model, words)
+
+            await asyncio.sleep(self.token_delay * len(words))
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+            )
+
+    async def stream(
+        self, request: web.Request, completion_id: str, model: str, words: list[str]
+    ) -> web.StreamResponse:
+        """Server-sent events, one chunk per word, terminated by `[DONE]`."""
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta, finish_reason=None):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+
+        await send({"role": "assistant"})
+        for word in words:
+            await send({"content": word})
+            await asyncio.sleep(self.token_delay)
+        await send({}, finish_reason="stop")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+class RasaStandIn:
+    """Rasa NLU `/model/parse` endpoint recognizing intents by keywords."""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        intents: dict[str, list[str]] = RASA_INTENTS,
+        seed: int = None,
+    ) -> Self:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.intents = intents
+        self.random = random.Random(seed)
+        self.stats = StandInStats()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/model/parse", self.parse)
+        return app
+
+    def intent(self, text: str) -> str:
+        words = set(re.findall(r"\w+", text.casefold()))
+        for name, keywords in self.intents.items():
+            if words.intersection(keywords):
+                return name
+        return RASA_FALLBACK_INTENT
+
+    async def parse(self, request: web.Request) -> web.Response:
+        with self.stats.track():
+            text = (await request.json())["text"]
+            await asyncio.sleep(self.latency)
+            if self.random.random() < self.error_rate:
+                self.stats.errors += 1
+                return web.json_response({"error": "stand-in error"}, status=500)
+
+            intent = {"name": self.intent(text), "confidence": 0.99}
+            return web.json_response(
+                {
+                    "text": text,
+                    "intent": intent,
+                    "entities": [],
+                    "intent_ranking": [intent],
+                }
+            )
+
+
+@contextlib.contextmanager
+def serve(
+    app: web.Application, host: str = "127.0.0.1", port: int = 0
+) -> Iterator[URL]:
+    """Serve app from a background thread, yields its base URL.
+
+    Port 0 picks a free one.
+    """
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    host, port = runner.addresses[0][:2]
+
+    thread = threading.Thread(target=loop.run_forever, name="stand-in", daemon=True)
+    thread.start()
+    try:
+        yield URL.build(scheme="http", host=host, port=port)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8300)
+    parser.add_argument("--rasa-port", type=int, default=8301)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    openai_standin = OpenAIStandIn(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    with (
+        serve(openai_standin.app(), args.host, args.openai_port) as openai_url,
+        serve(RasaStandIn().app(), args.host, args.rasa_port) as rasa_url,
+    ):
+        print(f"OPENAI_API_BASE={openai_url / 'v1'}")
+        print(f"rasa_provider={rasa_url}", flush=True)
+        with contextlib.suppress(KeyboardInterrupt):
+            threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Helpers for delivering streamed text to messaging clients."""
+
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+
+EDIT_INTERVAL = 1.0
+"""Minimum seconds between consecutive message edits."""
+
+
+async def progressive_edit(
+    chunks: AsyncIterator[str],
+    edit: Callable[[str, bool], Awaitable],
+    interval: float = EDIT_INTERVAL,
+    clock: Callable[[], float] = time.monotonic,
+) -> str:
+    """Accumulate streamed text chunks, publishing progress through `edit`.
+
+    `edit(text, final)` is called as soon as the first chunk arrives, then at
+    most once per `interval` seconds while the stream lasts, and exactly once
+    with `final=True` and complete text (unless the stream fails). Returns
+    complete text.
+    """
+
+    text = shown = ""
+    last_edit = float("-inf")
+
+    async for chunk in chunks:
+        text += chunk
+        if text.strip() and text != shown and clock() - last_edit >= interval:
+            await edit(text, False)
+            shown, last_edit = text, clock()
+
+    await edit(text, True)
+    return text
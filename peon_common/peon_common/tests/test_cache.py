@@ -0,0 +1,104 @@
+import pytest
+
+from peon_common.cache import MISSING, HTTPCache, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_expiration():
+    clock = Clock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=1)
+    cache.set("none", None)
+
+    clock.now = 5
+    assert cache.get("short", MISSING) is MISSING
+    assert cache.get("default") == 1
+    assert "none" in cache
+
+    clock.now = 10
+    assert cache.get("default", "expired") == "expired"
+    assert cache.get("none", MISSING) is MISSING
+
+
+class Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+
+class Session:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+def parse(response):
+    if response.status_code >= 500:
+        raise RuntimeError()
+    return response.body
+
+
+def test_http_cache_revalidation():
+    clock = Clock()
+    session = Session(
+        Response(200, "summary", {"ETag": '"v1"', "Last-Modified": "Mon"}),
+        Response(304),
+        Response(200, "updated"),
+    )
+    cache = HTTPCache(ttl=10, stale_ttl=100, session=session, clock=clock)
+
+    assert cache.fetch("q", "url", parse) == "summary"
+    assert cache.fetch("q", "url", parse) == "summary"
+    assert len(session.requests) == 1
+
+    clock.now = 15
+    assert cache.fetch("q", "url", parse) == "summary"
+    assert session.requests[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon"}
+
+    clock.now = 20
+    assert cache.fetch("q", "url", parse) == "summary"
+    assert len(session.requests) == 2
+
+    clock.now = 200
+    assert cache.fetch("q", "url", parse) == "updated"
+    assert session.requests[2] == {}
+
+
+def test_http_cache_misses_and_errors():
+    clock = Clock()
+    session = Session(Response(503), Response(404), Response(200, "found"))
+    cache = HTTPCache(ttl=10, negative_ttl=5, session=session, clock=clock)
+
+    with pytest.raises(RuntimeError):
+        cache.fetch("q", "url", parse)
+    assert cache.fetch("q", "url", parse) is None
+    assert cache.fetch("q", "url", parse) is None
+    assert len(session.requests) == 2
+
+    clock.now = 5
+    assert cache.fetch("q", "url", parse) == "found"
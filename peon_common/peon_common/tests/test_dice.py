@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from peon_common import dice
+from peon_common.exceptions import CommandMalformed
+
+
+@pytest.mark.parametrize(
+    ("term", "expected"),
+    [
+        ("d4", (1, 1, 4)),
+        ("2d8", (2, 1, 8)),
+        ("100", (1, 1, 100)),
+        ("42-59", (1, 42, 59)),
+        ("59-42", (1, 42, 59)),
+    ],
+)
+def test_parse_term(term, expected):
+    parsed = dice.parse_term(term)
+    assert (parsed.throws, parsed.low, parsed.high) == expected
+
+
+@pytest.mark.parametrize(
+    "terms",
+    [[], ["d0"], ["0d6"], ["2d"], ["abc"], [f"d{10**31}"], [f"{10**6 + 1}d6"],
+     ["d6"] * (dice.TERMS_LIMIT + 1), [f"101d{10**30}"]],  # fmt: skip
+)
+def test_parse_invalid(terms):
+    with pytest.raises(CommandMalformed):
+        dice.parse(terms)
+
+
+def test_draw_bounds():
+    terms = dice.parse(["1000d6", "500d20", "10-12", f"3d{10**30}"])
+    rolls = dice.draw(terms, np.random.default_rng(1))
+
+    assert [len(values) for values in rolls] == [1000, 500, 1, 3]
+    for term, values in zip(terms, rolls):
+        assert all(term.low <= int(v) <= term.high for v in values)
+
+
+def test_roll_format():
+    rng = np.random.default_rng(0)
+    assert dice.roll(["d1"], rng=rng) == "rolls: 1"
+    assert dice.roll(["2d1", "3-3"], rng=rng) == "rolls:\n2d1: 1, 1\n3-3: 3\n---\ntotal: 5"
+
+
+def test_roll_summary():
+    text = dice.roll(["1000d6", "2d1"], rng=np.random.default_rng(0))
+    lines = text.splitlines()
+
+    assert len(text) <= dice.MESSAGE_LIMIT
+    assert lines[0] == "rolls:"
+    assert lines[1].startswith("1000d6: sum ")
+    assert sum(int(c.split("×")[1]) for c in lines[2].split()) == 1000
+    assert lines[3] == "2d1: 1, 1"
+
+
+@pytest.mark.parametrize(
+    "terms",
+    [["1000d6"] * 60, ["500d20", "1000d6"] * 50, [f"1-{10**15}"] * 100],
+)
+def test_roll_limit(terms):
+    rng = np.random.default_rng(0)
+    text = dice.roll(terms, rng=rng)
+    rolls = dice.draw(dice.parse(terms), np.random.default_rng(0))
+
+    assert len(text) <= dice.MESSAGE_LIMIT
+    assert text.endswith(f"\ntotal: {sum(int(values.sum()) for values in rolls)}")
+
+
+@pytest.mark.parametrize(
+    ("term", "expected"),
+    [
+        ("2d6", [1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1]),
+        ("3d2", [1, 3, 3, 1]),
+        ("4-5", [1, 1]),
+    ],
+)
+def test_distribution(term, expected):
+    offset, probabilities, exact = dice.distribution([dice.parse_term(term)])
+    expected = np.array(expected) / sum(expected)
+
+    assert exact
+    assert offset == dice.parse_term(term).throws * dice.parse_term(term).low
+    assert np.allclose(probabilities, expected)
+
+
+def test_convolve_fft():
+    a = np.random.default_rng(0).random(2000)
+    assert np.allclose(
+        dice.convolve(a, a), np.convolve(a, a), atol=1e-9 * a.sum() ** 2
+    )
+
+
+def test_odds():
+    assert dice.odds("3d6+2d4 >= 14").splitlines()[:2] == [
+        "3d6+2d4 (5-26, mean 15.50):",
+        "P(>= 14) = 71.85%",
+    ]
+    assert "P(= 20) = 5.00%" in dice.odds("d20 = 20")
+    assert "P(> 12) = 0%" in dice.odds("2d6 > 12")
+    assert "50%: 350" in dice.odds("100d6")
+    assert dice.odds("3d6 2d4 >= 14").splitlines()[1] == "P(>= 14) = 71.85%"
+
+
+def test_odds_approximate():
+    lines = dice.odds("1000d6 >= 5900").splitlines()
+    assert lines[1] == "P(>= 5900) ≈ 0%"
+    assert dice.odds("1000d6 >= 1000").splitlines()[1] == "P(>= 1000) ≈ 100.00%"
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["", ">= 5", "3d6 >=", "d6 ! 3", "2000d1000",
+     "+".join(["10d999"] * 100), " ".join(["1-9999"] * 100)],  # fmt: skip
+)
+def test_odds_invalid(expression):
+    with pytest.raises(CommandMalformed):
+        dice.odds(expression)
@@ -0,0 +1,60 @@
+import pytest
+
+from peon_common import eliza
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_reflection():
+    engine = eliza.engine()
+    assert engine is eliza.engine()
+    assert engine.reflect("I am tired of my job") == "you are tired of your job"
+
+
+def test_session_avoids_repeats():
+    session = eliza.ElizaSession(eliza.engine())
+    replies = [session.respond("hello") for _ in range(3)]
+    assert len(set(replies)) == 3
+
+
+def test_session_memory(monkeypatch):
+    monkeypatch.setattr(eliza.random, "random", lambda: 0.0)
+    session = eliza.ElizaSession(eliza.engine())
+
+    session.respond("my cat ignores me")
+    assert "your cat ignores you" in session.respond("whatever")
+    assert not session.memories
+
+
+def test_pool_eviction(clock):
+    pool = eliza.ElizaPool(maxsize=2, idle_timeout=100, clock=clock)
+    for owner in ("a", "b", "c"):
+        pool.respond(owner, "hello")
+    assert list(pool.sessions) == ["b", "c"]
+
+    clock.now = 50
+    pool.respond("b", "hello")
+    clock.now = 120
+    pool.respond("b", "hello")
+    assert list(pool.sessions) == ["b"]
+
+
+def test_pool_memory_limit(clock):
+    pool = eliza.ElizaPool(memory_limit=300, clock=clock)
+    for owner in range(20):
+        pool.respond(owner, "my " + "x" * 100)
+
+    assert pool.memory <= 300
+    assert pool.memory == sum(s.size for s in pool.sessions.values())
+    assert 19 in pool.sessions
@@ -0,0 +1,118 @@
+import io
+import re
+import time
+
+import mock
+import pytest
+from PIL import Image, ImageFile
+
+from peon_common import functions
+from peon_common.exceptions import CommandExecutionError, ServiceUnavailable
+
+
+@pytest.mark.parametrize("limit", [50, 600, 4096])
+def test_starify(limit):
+    sentence = "each minute a minute passes"
+    sky = functions.starify(sentence, limit=limit)
+
+    assert len(sky) == limit
+    assert sky.index(" each.. ") < sky.index(" ..minute.. ") < sky.index(" ...passes ")
+    for chunk in re.split(r" \.*\w+\.* ", sky):
+        assert all(a != b for a, b in zip(chunk, chunk[1:]) if a != " ")
+
+
+def test_starify_seed():
+    first = functions.starify("hello there", seed=42)
+    assert first == functions.starify("hello there", seed=42)
+    assert first != functions.starify("hello there", seed=43)
+
+
+def test_starify_overflow():
+    assert functions.starify("word " * 10, limit=5).startswith(" word.. ")
+
+
+def image_bytes(image, format="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("size", "limit"), [((512, 256), 1992), ((100, 1000), 1992), ((64, 64), 4088)]
+)
+def test_image_to_ascii(size, limit):
+    data = image_bytes(Image.radial_gradient("L").convert("RGB").resize(size))
+    art = functions.image_to_ascii(data, limit=limit)
+    rows = art.split("\n")
+
+    assert len(art) <= limit
+    assert len({len(row) for row in rows}) == 1
+    assert set(art) <= set(functions.ascii_ascending_luminance + "\n")
+    assert rows[0][0] == "@" and "." in rows[len(rows) // 2]
+
+
+def test_image_to_ascii_cache():
+    data = image_bytes(Image.new("RGB", (32, 32), "white"))
+    with mock.patch.object(Image, "open", wraps=Image.open) as open_mock:
+        first = functions.image_to_ascii(data)
+        assert functions.image_to_ascii(data) == first
+        assert open_mock.call_count == 1
+    assert set(first) == {"@", "\n"}
+
+
+def test_image_to_ascii_invalid():
+    with pytest.raises(CommandExecutionError):
+        functions.image_to_ascii(b"not an image")
+
+
+def test_image_to_ascii_too_large():
+    data = image_bytes(Image.new("RGB", (101, 100), "white"))
+    with (
+        mock.patch.object(functions, "ASCII_ART_MAX_PIXELS", 100 * 100),
+        mock.patch.object(ImageFile.ImageFile, "load") as load,
+    ):
+        with pytest.raises(CommandExecutionError):
+            functions.image_to_ascii(data)
+        assert load.call_count == 0
+
+
+def fake_wiki(pages, delays=None):
+    def lookup(lang, query):
+        time.sleep((delays or {}).get(lang, 0))
+        if isinstance(pages.get(lang), Exception):
+            raise pages[lang]
+        return pages.get(lang)
+
+    return lookup
+
+
+@pytest.mark.parametrize(
+    "pages, delays, expected",
+    [
+        ({"en": "en page", "ru": "ru page"}, {"en": 0.2}, "en page"),
+        ({"ru": "ru page", "et": "et page"}, {"ru": 0.2}, "ru page"),
+        ({"et": "et page"}, {}, "et page"),
+        ({"en": ServiceUnavailable(), "ru": "ru page"}, {}, "ru page"),
+    ],
+)
+def test_wiki_summary_preference(pages, delays, expected):
+    with mock.patch.object(functions, "wiki_lookup", fake_wiki(pages, delays)):
+        assert functions.wiki_summary("query", ["en", "ru", "et"]) == expected
+
+
+def test_wiki_summary_not_found():
+    with mock.patch.object(functions, "wiki_lookup", fake_wiki({})):
+        with pytest.raises(CommandExecutionError):
+            functions.wiki_summary("query", ["en", "ru"])
+
+    pages = {"ru": ServiceUnavailable()}
+    with mock.patch.object(functions, "wiki_lookup", fake_wiki(pages)):
+        with pytest.raises(ServiceUnavailable):
+            functions.wiki_summary("query", ["en", "ru"])
+
+
+def test_wiki_languages():
+    with mock.patch.dict("os.environ", {"wiki_languages": " ru, et ,"}):
+        assert functions.wiki_languages() == ["ru", "et"]
+    with mock.patch.dict("os.environ", {"wiki_languages": ""}):
+        assert functions.wiki_languages() == functions.WIKI_LANGUAGES
@@ -0,0 +1,55 @@
+import pytest
+
+from peon_common.gazetteer import Gazetteer, Place, fold, gazetteer, stem
+
+
+def test_fold():
+    assert fold("Pärnu, ЁЛКА й") == "parnu, елка й"
+
+
+@pytest.mark.parametrize(
+    "words",
+    [
+        ["москва", "москве", "москву", "москвой"],
+        ["нижний", "нижнем"],
+        ["tallinn", "tallinnas", "tallinnast", "tallinna"],
+        ["tartu", "tartus", "tartusse"],
+    ],
+)
+def test_stem(words):
+    assert len({stem(fold(word)) for word in words}) == 1
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("weather in moscow", "Moscow,RU"),
+        ("какая погода в Москве?", "Moscow,RU"),
+        ("погода в Санкт-Петербурге", "Saint Petersburg,RU"),
+        ("погода в Нижнем Новгороде", "Nizhny Novgorod,RU"),
+        ("milline ilm on Tallinnas", "Tallinn,EE"),
+        ("weather in Parnu", "Pärnu,EE"),
+        ("is it raining in new york city", "New York,US"),
+        ("weather in Tartu, Estonia", "Tartu,EE"),
+        ("погода в эстонии", "Tallinn,EE"),
+        ("погода в питере и в москве", None),
+        ("what's the weather like?", None),
+    ],
+)
+def test_locate(text, expected):
+    place = gazetteer().locate(text)
+    assert (place and place.query) == expected
+
+
+def test_ambiguous_alias():
+    index = Gazetteer(
+        [
+            (Place("Paris", "Paris,FR"), []),
+            (Place("Paris", "Paris,US"), []),
+            (Place("France", "Paris,FR", is_country=True), []),
+        ]
+    )
+    assert len(index.find("weather in paris")) == 2
+    assert index.locate("weather in paris") is None
+    assert index.locate("weather in paris, france") is None
+    assert index.locate("weather in france").name == "France"
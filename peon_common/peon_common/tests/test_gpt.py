@@ -1,19 +1,43 @@
+import asyncio
 import mock
 import os
 import peon_common.gpt
 import pytest
 import requests
+import time
 from datetime import datetime
 from mock import MagicMock
 from pathlib import Path
 from yarl import URL
 
-from peon_common import gpt
+from peon_common import gpt, standins
 from peon_common.db import GPTChatHistory
 
 import openai
 
 
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def completion_cache():
+    gpt.Completion.CACHE.clear()
+    gpt.IntentManager.CACHE.clear()
+    gpt.Completion.ROLES.clear()
+    gpt.Completion.MODEL_OVERRIDES.clear()
+    with (
+        mock.patch.object(gpt.Completion, "SCHEDULER", gpt.FairScheduler()),
+        mock.patch("peon_common.gpt.GPTModelSetting") as model_setting,
+    ):
+        model_setting.get.return_value = None
+        yield gpt.Completion.CACHE
+
+
 @pytest.fixture
 def openai_mock():
     with mock.patch("openai.ChatCompletion") as openai_mock:
@@ -91,15 +115,430 @@ SAMPLE_INTENT_DATA = {
 
 @pytest.fixture
 def rasa_env():
-    os.environ[gpt.RASA_PROVIDER_URL_ENV] = "http://localhost:5005"
+    with standins.serve(standins.RasaStandIn(latency=0).app()) as url:
+        with mock.patch.dict(os.environ, {gpt.RASA_PROVIDER_URL_ENV: str(url)}):
+            yield
+
 
-# TODO: intent provider
 def test_rasa_provider(rasa_env):
     intent_provider = gpt.RasaLocal()
-    x = intent_provider.get_intent("what's the current weather?")
-    import pdb; pdb.set_trace()
+    data = intent_provider.get_intent("what's the current weather?")
+    assert data == {
+        "intent": {"name": "query_weather", "confidence": 0.99},
+        "entities": [],
+    }
+    data = asyncio.run(intent_provider.aget_intent("hello there"))
+    assert data["intent"]["name"] == "greet"
 
 
 # TODO: intent manager
 # TODO: completion
 # TODO: completion mocks for all classes above that use Completion.request()/etc
+
+
+@pytest.mark.parametrize(
+    "text, gpt_reply, expected",
+    [
+        ("what's the weather in Tallinn?", None, "Tallinn,EE"),
+        ("what's the weather in Smallville?", "Smallville", "smallville"),
+        ("what's the weather like?", "none", None),
+    ],
+)
+def test_extract_location(text, gpt_reply, expected):
+    with mock.patch("peon_common.gpt.Completion") as completion:
+        completion.return_value.request.return_value = gpt_reply
+        assert gpt.IntentManager.extract_location(text) == expected
+
+    assert completion.called == (gpt_reply is not None)
+
+
+@pytest.fixture
+def gpt_env():
+    env = {"openai_token": "test", gpt.RASA_PROVIDER_URL_ENV: "http://localhost:5005"}
+    with mock.patch.dict(os.environ, env):
+        yield
+
+
+async def events(*contents):
+    yield {"choices": [{"delta": {"role": "assistant"}}]}
+    for content in contents:
+        yield {"choices": [{"delta": {"content": content}}]}
+    yield {"choices": [{"delta": {}}]}
+
+
+def test_completion_astream(gpt_env, chat_history_mock, openai_mock):
+    openai_mock.acreate = mock.AsyncMock(return_value=events("open", "ai"))
+    chat_history_mock.fetch_with_summary.return_value = (
+        "user likes cats",
+        [{"role": "user", "content": "hi"}],
+    )
+    completion = gpt.Completion()
+
+    async def consume():
+        stream = completion.astream("test", owner_id="owner1", use_history=True)
+        first = await anext(stream)
+        stored_early = chat_history_mock.store.call_count
+        return [first] + [chunk async for chunk in stream], stored_early
+
+    with mock.patch.object(completion, "get_role", return_value=None):
+        chunks, stored_early = asyncio.run(consume())
+
+    assert chunks == ["open", "ai"] and stored_early == 0
+    create_kwargs = openai_mock.acreate.call_args.kwargs
+    assert create_kwargs["stream"] is True
+    assert create_kwargs["max_tokens"] == gpt.MAX_TOKENS
+    assert [m["content"] for m in create_kwargs["messages"]] == [
+        f"{gpt.ROLE_DEFAULT}\n\nSUMMARY OF EARLIER CONVERSATION:\nuser likes cats",
+        "hi",
+        "test",
+    ]
+    chat_history_mock.store.assert_called_once_with("owner1", "test", "openai")
+
+
+def test_completion_arequest_intents(gpt_env, chat_history_mock, openai_mock):
+    openai_mock.acreate = mock.AsyncMock(
+        return_value={"choices": [{"message": {"content": "openai_reply"}}]}
+    )
+    completion = gpt.Completion()
+    provider = mock.MagicMock(spec=gpt.RasaLocal)
+    provider.aget_intent = mock.AsyncMock(return_value=SAMPLE_INTENT_DATA)
+    completion.intent_manager.intent_provider = provider
+
+    with mock.patch.object(
+        gpt.IntentManager, "query_weather", return_value="sunny"
+    ) as query_weather:
+        completion.intent_manager.intents["query_weather"] = query_weather
+        reply = asyncio.run(completion.arequest("weather?", handle_intents=True))
+
+    assert reply == "openai_reply"
+    query_weather.assert_called_once_with("weather?")
+    prompt = openai_mock.acreate.call_args.kwargs["messages"][-1]["content"]
+    assert prompt == "weather?\n\nRELATED DATA:\nsunny"
+    assert openai_mock.acreate.call_args.kwargs["max_tokens"] == gpt.MAX_TOKENS
+    assert chat_history_mock.store.call_count == 0
+
+
+def interactions(count):
+    return [
+        MagicMock(user_message=f"q{i}", system_reply=f"a{i}", timestamp=i)
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("count, condensed", [(3, 0), (9, 0), (10, 4), (15, 9)])
+def test_history_compactor(chat_history_mock, count, condensed):
+    history = MagicMock(owner_id="owner1", summary="old")
+    history.unsummarized.return_value = interactions(count)
+    compactor = gpt.HistoryCompactor(keep_raw=6, min_batch=4)
+
+    with mock.patch.object(gpt, "Completion") as completion:
+        completion.return_value.summarize.return_value = "new"
+        assert compactor.compact(history) == bool(condensed)
+
+    if condensed:
+        summary, pending, owner_id = completion.return_value.summarize.call_args.args
+        assert (summary, owner_id) == ("old", "owner1")
+        assert [i.timestamp for i in pending] == list(range(condensed))
+        chat_history_mock.store_summary.assert_called_once_with(
+            "owner1", "new", condensed - 1
+        )
+    else:
+        assert chat_history_mock.store_summary.call_count == 0
+
+
+def test_summarize_usage(gpt_env, openai_mock):
+    openai_mock.create.return_value = {
+        "choices": [{"message": {"content": " new summary "}}],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 30},
+    }
+    completion = gpt.Completion()
+    requests, tokens = completion.SCHEDULER.requests, completion.SCHEDULER.tokens
+
+    with mock.patch.object(gpt.GPT_METRICS, "record") as record:
+        summary = completion.summarize("old", interactions(4), "owner1")
+
+    assert summary == "new summary"
+    assert openai_mock.create.call_args.kwargs["max_tokens"] == gpt.SUMMARY_MAX_TOKENS
+    stats = record.call_args.args[0]
+    assert (stats.owner_id, stats.purpose) == ("owner1", gpt.PURPOSE_SUMMARY)
+    assert (stats.prompt_tokens, stats.completion_tokens) == (120, 30)
+    assert tokens.capacity - tokens.level == pytest.approx(150, abs=1)
+    assert requests.capacity - requests.level == pytest.approx(1, abs=0.1)
+
+
+def test_completion_cache(gpt_env, chat_history_mock, openai_mock, completion_cache):
+    completion = gpt.Completion()
+    with mock.patch.object(completion, "get_role", return_value=None):
+        assert completion.request("extract") == "openai_reply"
+        assert completion.request("extract") == "openai_reply"
+        assert completion.request("extract", owner_id="owner1") == "openai_reply"
+        assert completion.request("extract", owner_id="owner1") == "openai_reply"
+        assert openai_mock.create.call_count == 3
+
+        completion.temperature = 0
+        completion.request("extract")
+        assert openai_mock.create.call_count == 4
+        assert len(completion_cache) == 2
+
+    openai_mock.acreate = mock.AsyncMock(return_value=openai_mock.create.return_value)
+    assert asyncio.run(completion.arequest("extract")) == "openai_reply"
+    assert openai_mock.acreate.call_count == 0
+
+
+def test_completion_cache_skips_intents(gpt_env, openai_mock, completion_cache):
+    completion = gpt.Completion()
+    openai_mock.acreate = mock.AsyncMock(return_value=openai_mock.create.return_value)
+    with (
+        mock.patch.object(
+            completion.intent_manager, "handle_prompt", side_effect=["sunny", "rain"]
+        ) as handle_prompt,
+        mock.patch.object(
+            completion.intent_manager, "ahandle_prompt", return_value="sunny"
+        ) as ahandle_prompt,
+    ):
+        for _ in range(2):
+            completion.request("weather in Tallinn?", handle_intents=True)
+            asyncio.run(completion.arequest("weather in Riga?", handle_intents=True))
+
+    assert handle_prompt.call_count == ahandle_prompt.call_count == 2
+    assert openai_mock.create.call_count == openai_mock.acreate.call_count == 2
+    assert "RELATED DATA:\nrain" in (
+        openai_mock.create.call_args.kwargs["messages"][-1]["content"]
+    )
+    assert len(completion_cache) == 0
+
+
+@pytest.mark.parametrize(
+    "text, candidate",
+    [
+        ("current weather in Moscow?", True),
+        ("будет ли завтра дождь", True),
+        ("milline ilm on Tallinnas", True),
+        ("tell me a joke", False),
+        ("привет, как дела?", False),
+    ],
+)
+def test_intent_prefilter(text, candidate):
+    provider = MagicMock(spec=gpt.RasaLocal)
+    provider.get_intent.return_value = SAMPLE_INTENT_DATA
+    manager = gpt.IntentManager(provider)
+    manager.intents["query_weather"] = MagicMock(return_value="sunny")
+
+    for _ in range(2):
+        assert manager.handle_prompt(text) == ("sunny" if candidate else None)
+        assert manager.handle_prompt(f"  {text.upper()} ") == (
+            "sunny" if candidate else None
+        )
+
+    assert provider.get_intent.call_count == int(candidate)
+
+
+def test_concurrent_context_assembly(gpt_env, chat_history_mock, openai_mock):
+    completion = gpt.Completion()
+
+    def slow(result):
+        def call(*args, **kwargs):
+            time.sleep(0.2)
+            return result
+
+        return call
+
+    async def slow_intents(text):
+        await asyncio.sleep(0.5)
+        return "sunny"
+
+    chat_history_mock.fetch_with_summary.side_effect = slow((None, []))
+    deadlines = {"role": 1, "history": 1, "intents": 0.3}
+    with (
+        mock.patch.object(completion, "get_role", side_effect=slow("role")),
+        mock.patch.object(completion.intent_manager, "ahandle_prompt", slow_intents),
+        mock.patch.dict(gpt.CONTEXT_DEADLINES, deadlines),
+    ):
+        start = time.monotonic()
+        window, prompt = asyncio.run(
+            completion.abuild_messages(
+                "weather?", owner_id="owner1", use_history=True, handle_intents=True
+            )
+        )
+        elapsed = time.monotonic() - start
+
+    assert 0.2 <= elapsed < 0.45
+    assert prompt == "weather?"
+    assert [m["content"] for m in window.messages] == ["role", "weather?"]
+
+
+def test_role_cache(gpt_env):
+    completion = gpt.Completion()
+    with mock.patch("peon_common.gpt.GPTRoleSetting") as role_setting:
+        role_setting.get.return_value = None
+        assert completion.get_role("owner1") is None
+        assert completion.get_role("owner1") is None
+        assert role_setting.get.call_count == 1
+
+        completion.set_role("owner1", "pirate")
+        role_setting.set.assert_called_once_with("owner1", "pirate")
+        assert completion.get_role("owner1") == "pirate"
+
+        completion.reset_role("owner1")
+        role_setting.remove.assert_called_once_with("owner1")
+        assert completion.get_role("owner1") is None
+        assert role_setting.get.call_count == 1
+
+        role_setting.get.return_value = MagicMock(role_description="wizard")
+        gpt.Completion.ROLES.clear()
+        assert completion.get_role("owner1") == "wizard"
+        assert role_setting.get.call_count == 2
+
+
+@pytest.fixture
+def openai_standin():
+    standin = standins.OpenAIStandIn(latency=0, token_delay=0, reply_tokens=5, seed=1)
+    with standins.serve(standin.app()) as url:
+        with mock.patch.object(openai, "api_base", str(url / "v1")):
+            yield standin
+
+
+def test_completion_standin(gpt_env, chat_history_mock, openai_standin):
+    completion = gpt.Completion()
+    with (
+        mock.patch.object(completion, "get_role", return_value=None),
+        mock.patch.object(gpt.GPT_METRICS, "record") as record,
+    ):
+        reply = completion.request("hi")
+        stats = record.call_args.args[0]
+        assert len(reply.split()) == 5
+        assert stats.completion_tokens == openai_standin.stats.completion_tokens
+        assert stats.prompt_tokens == openai_standin.stats.prompt_tokens
+
+        async def consume():
+            stream = completion.astream("hi", owner_id="owner1")
+            return [chunk async for chunk in stream]
+
+        chunks = asyncio.run(consume())
+        assert len(chunks) == 5
+        assert record.call_args.args[0].first_token is not None
+        chat_history_mock.store.assert_called_once_with("owner1", "hi", "".join(chunks))
+
+        openai_standin.rate_limit_rate = 1
+        with pytest.raises(openai.error.RateLimitError):
+            asyncio.run(completion.arequest("hi", owner_id="owner1"))
+
+    assert openai_standin.stats.as_dict() == {
+        "requests": 3,
+        "errors": 1,
+        "prompt_tokens": stats.prompt_tokens * 2,
+        "completion_tokens": mock.ANY,
+        "active": 0,
+        "max_active": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "prompt, purpose, latencies, expected",
+    [
+        ("hello there", gpt.PURPOSE_CHAT, {}, gpt.MODEL_DEFAULT),
+        ("why?", gpt.PURPOSE_CHAT, {}, gpt.MODEL_DEFAULT),
+        (
+            "please explain why the sky is blue during the day",
+            gpt.PURPOSE_CHAT,
+            {},
+            gpt.MODEL_4_O,
+        ),
+        ("word " * 500, gpt.PURPOSE_CHAT, {}, gpt.MODEL_4_O),
+        (
+            "объясни почему небо голубое днём, а закат красный",
+            gpt.PURPOSE_CHAT,
+            {(gpt.MODEL_4_O, gpt.PURPOSE_CHAT): 30},
+            gpt.MODEL_DEFAULT,
+        ),
+        ("extract", gpt.PURPOSE_EXTRACTION, {}, gpt.MODEL_4_O_MINI),
+        (
+            "extract",
+            gpt.PURPOSE_EXTRACTION,
+            {(gpt.MODEL_3_5_TURBO, gpt.PURPOSE_EXTRACTION): 1},
+            gpt.MODEL_3_5_TURBO,
+        ),
+        (
+            "extract",
+            gpt.PURPOSE_EXTRACTION,
+            {
+                (gpt.MODEL_4_O_MINI, gpt.PURPOSE_EXTRACTION): 2,
+                (gpt.MODEL_3_5_TURBO, gpt.PURPOSE_EXTRACTION): 1,
+            },
+            gpt.MODEL_3_5_TURBO,
+        ),
+        (
+            "extract",
+            gpt.PURPOSE_EXTRACTION,
+            {
+                (gpt.MODEL_4_O_MINI, gpt.PURPOSE_EXTRACTION): 1,
+                (gpt.MODEL_3_5_TURBO, gpt.PURPOSE_EXTRACTION): 2,
+                (gpt.MODEL_3_5_TURBO, gpt.PURPOSE_CHAT): 0.1,
+            },
+            gpt.MODEL_4_O_MINI,
+        ),
+    ],
+)
+def test_model_router(prompt, purpose, latencies, expected):
+    completion_metrics = gpt.CompletionMetrics()
+    for (model, model_purpose), latency in latencies.items():
+        stats = gpt.CompletionStats(model, None, 10, 10, latency, purpose=model_purpose)
+        for _ in range(gpt.MODEL_MIN_SAMPLES):
+            completion_metrics.record(stats)
+    router = gpt.ModelRouter(metrics=completion_metrics, explore_rate=0)
+
+    assert router.route(prompt, purpose) == expected
+
+
+@pytest.mark.parametrize(
+    ("samples", "age", "roll", "expected"),
+    [
+        # too few samples of the faster model, explored only occasionally
+        ({gpt.MODEL_4_O_MINI: (5, 2), gpt.MODEL_3_5_TURBO: (1, 1)}, 0, 0.5, 0),
+        ({gpt.MODEL_4_O_MINI: (5, 2), gpt.MODEL_3_5_TURBO: (1, 1)}, 0, 0.01, 1),
+        ({gpt.MODEL_4_O_MINI: (5, 2), gpt.MODEL_3_5_TURBO: (5, 1)}, 0, 0.01, 1),
+        # all samples aged out of the window: back to the preferred model
+        ({gpt.MODEL_4_O_MINI: (5, 2), gpt.MODEL_3_5_TURBO: (5, 1)}, 3600, 0.5, 0),
+        # neither is known yet: the one with more samples is kept
+        ({gpt.MODEL_4_O_MINI: (1, 1), gpt.MODEL_3_5_TURBO: (2, 2)}, 0, 0.5, 1),
+    ],
+)
+def test_model_router_exploration(samples, age, roll, expected):
+    clock = Clock()
+    completion_metrics = gpt.CompletionMetrics(clock=clock)
+    for model, (count, latency) in samples.items():
+        stats = gpt.CompletionStats(
+            model, None, 10, 10, latency, purpose=gpt.PURPOSE_EXTRACTION
+        )
+        for _ in range(count):
+            completion_metrics.record(stats)
+    clock.now += age
+    rng = mock.Mock(random=mock.Mock(return_value=roll), choice=lambda m: m[-1])
+    router = gpt.ModelRouter(metrics=completion_metrics, rng=rng)
+
+    routed = router.route("extract", gpt.PURPOSE_EXTRACTION)
+    assert routed == gpt.MODELS_FAST[expected]
+
+
+def test_model_override(gpt_env, chat_history_mock, openai_mock):
+    completion = gpt.Completion()
+    with (
+        mock.patch("peon_common.gpt.GPTModelSetting") as model_setting,
+        mock.patch.object(completion, "get_role", return_value=None),
+    ):
+        model_setting.get.return_value = MagicMock(model=gpt.MODEL_3_5_TURBO)
+        completion.request("hello there", owner_id="owner1")
+        completion.request("hello there", owner_id="owner2")
+        assert model_setting.get.call_count == 2
+        assert openai_mock.create.call_args.kwargs["model"] == gpt.MODEL_3_5_TURBO
+
+        with pytest.raises(gpt.ValidationError):
+            completion.set_model_override("owner1", "gpt-42")
+        completion.set_model_override("owner1", None)
+        model_setting.remove.assert_called_once_with("owner1")
+        completion.request("hello there", owner_id="owner1")
+        assert openai_mock.create.call_args.kwargs["model"] == gpt.MODEL_DEFAULT
+        assert model_setting.get.call_count == 2
+
+        completion.request("hello there", purpose=gpt.PURPOSE_EXTRACTION)
+        assert openai_mock.create.call_args.kwargs["model"] in gpt.MODELS_FAST
@@ -0,0 +1,126 @@
+import math
+
+import mock
+
+import pytest
+
+from peon_common import metrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ring_buffer():
+    buffer = metrics.RingBuffer(5)
+    assert math.isnan(buffer.last)
+    assert buffer.stats(60, 0) == {}
+
+    for second in range(8):
+        buffer.append(second, second * 10)
+
+    assert buffer.count == 5
+    assert buffer.last == 70
+    assert sorted(buffer.window(100, 7)) == [30, 40, 50, 60, 70]
+    assert sorted(buffer.window(1, 7)) == [60, 70]
+    assert buffer.stats(2, 7) == {
+        "min": 50.0,
+        "avg": 60.0,
+        "max": 70.0,
+        "p95": pytest.approx(69.0),
+    }
+
+
+def test_sampler_summary():
+    clock = Clock()
+    sampler = metrics.HostMetricsSampler(interval=5, history=60, clock=clock)
+    assert not sampler.has_data()
+
+    for _ in range(3):
+        sampler.sample()
+        clock.now += 5
+
+    assert sampler.series["cpu"].capacity == 13
+    summary = sampler.summary(windows={"10s": 10, "1m": 60})
+    lines = summary.splitlines()
+    assert lines[1].startswith("CPU %")
+    assert [line.split()[0] for line in lines[2:4]] == ["10s", "1m"]
+    assert "peon RSS" not in summary
+    assert "peon RSS" in sampler.summary(process=True)
+
+
+def completion_stats(owner_id, wall_time, **kwargs):
+    return metrics.CompletionStats(
+        model="gpt",
+        owner_id=owner_id,
+        prompt_tokens=100,
+        completion_tokens=20,
+        wall_time=wall_time,
+        **kwargs,
+    )
+
+
+def test_completion_metrics():
+    clock = Clock()
+    gpt_metrics = metrics.CompletionMetrics(capacity=10, clock=clock)
+
+    for second in range(1, 5):
+        gpt_metrics.record(completion_stats("guild1", second, timings={"history": 0.5}))
+    gpt_metrics.record(completion_stats(None, 10, first_token=0.25))
+
+    assert gpt_metrics.series["wall"].percentiles(60, clock.now) == {
+        "p50": 3.0,
+        "p95": pytest.approx(8.8),
+        "count": 5,
+    }
+    assert gpt_metrics.series["first_token"].count == 1
+    assert gpt_metrics.series["intents"].count == 0
+    summary = gpt_metrics.latency_summary(windows={"1m": 60})
+    lines = summary.splitlines()
+    history = lines.index("history s")
+    assert lines[history + 1].split() == ["1m", "0.50", "0.50", "4"]
+    assert lines[lines.index("intents s") + 1] == "prompt tok"
+
+    with mock.patch("peon_common.metrics.GPTUsage") as usage:
+        usage.add.side_effect = [None, Exception("db down")]
+        with pytest.raises(Exception):
+            gpt_metrics.flush()
+        (day, owner_id, model), counters = usage.add.call_args_list[0]
+        assert (owner_id, model) == ("guild1", "gpt")
+        assert counters == {
+            "requests": 4,
+            "prompt_tokens": 400,
+            "completion_tokens": 80,
+            "wall_time": 10,
+        }
+
+        usage.add.side_effect = None
+        assert gpt_metrics.flush() == 1
+        assert usage.add.call_args.args[1] == metrics.ANONYMOUS_OWNER
+        assert gpt_metrics.flush() == 0
+
+
+def test_completion_metrics_partial_flush():
+    gpt_metrics = metrics.CompletionMetrics(capacity=10, clock=Clock())
+    for owner_id in ("guild1", "guild2", "guild3"):
+        gpt_metrics.record(completion_stats(owner_id, 1))
+
+    with mock.patch("peon_common.metrics.GPTUsage") as usage:
+        usage.add.side_effect = [Exception("db down"), None, None]
+        with pytest.raises(Exception, match="db down"):
+            gpt_metrics.flush()
+        assert [call.args[1] for call in usage.add.call_args_list] == [
+            "guild1",
+            "guild2",
+            "guild3",
+        ]
+
+        usage.add.reset_mock(side_effect=True)
+        assert gpt_metrics.flush() == 1
+        assert usage.add.call_args.args[1] == "guild1"
+        assert usage.add.call_args.kwargs["requests"] == 1
+        assert gpt_metrics.flush() == 0
@@ -39,13 +39,32 @@ SAMPLE_WEATHER_REPLY = {
 }
 
 
+SAMPLE_GEOCODING_REPLY = [
+    {
+        "name": "London",
+        "local_names": {"en": "London", "ru": "Лондон"},
+        "lat": 51.5073219,
+        "lon": -0.1276474,
+        "country": "GB",
+    }
+]
+
+
+def fake_get(url, **kwargs):
+    if url.path.startswith("/geo/"):
+        places = SAMPLE_GEOCODING_REPLY if url.query["q"] != "nowhere" else []
+        return mock.MagicMock(json=lambda: places)
+    return mock.MagicMock(json=lambda: SAMPLE_WEATHER_REPLY)
+
+
 @pytest.fixture(autouse=True)
 def prep():
     os.environ[misc.OPENWEATHER_TOKEN] = "test_key"
-    response_mock = mock.MagicMock(json=lambda: SAMPLE_WEATHER_REPLY)
+    misc.Weather.LOCATIONS.clear()
+    misc.Weather.REPORTS.clear()
 
-    with mock.patch("requests.get", return_value=response_mock):
-        yield
+    with mock.patch("requests.get", side_effect=fake_get) as get_mock:
+        yield get_mock
 
 
 def test_weather():
@@ -59,3 +78,32 @@ def test_weather():
         "wind": "7.72m/s, W",
         "clouds": "75%",
     }
+
+
+def test_weather_cache(prep):
+    weather = misc.Weather()
+    for location in ["London", "london ", " LONDON"]:
+        assert weather.query_weather(location)["location"] == "test_location"
+    assert prep.call_count == 2
+
+    SAMPLE_GEOCODING_REPLY[0]["lat"] += 0.0001
+    assert weather.query_weather("Лондон")["location"] == "test_location"
+    assert prep.call_count == 3
+    SAMPLE_GEOCODING_REPLY[0]["lat"] -= 0.0001
+
+    weather_url = prep.call_args_list[1].args[0]
+    assert weather_url.query["lat"] == "51.51" and weather_url.query["lon"] == "-0.13"
+
+    misc.Weather.REPORTS.clear()
+    weather.query_weather("london")
+    assert prep.call_count == 4
+
+
+def test_weather_unknown_location(prep):
+    weather = misc.Weather()
+    for _ in range(2):
+        assert weather.query_weather("nowhere") == {
+            "location": "nowhere",
+            "error_message": "city not found",
+        }
+    assert prep.call_count == 1
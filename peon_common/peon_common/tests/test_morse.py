@@ -0,0 +1,68 @@
+import pytest
+
+from peon_common import functions
+from peon_common.morse import MORSE, UNKNOWN
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("sos", "... --- ..."),
+        ("SOS", "... --- ..."),
+        ("hi there", ".... ..   - .... . .-. ."),
+        ("a, b", ".- --..--   -..."),
+        ("a#b", ".- -..."),
+        ("<sos> <AR>", "...---...   .-.-."),
+        ("<nope>", "-. --- .--. ."),
+    ],
+)
+def test_to_morse(text, expected):
+    assert functions.to_morse(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("code", "expected"),
+    [
+        ("... --- ...", "sos"),
+        (".... ..   - .... . .-. .", "hi there"),
+        (".... .. / - .... . .-. .", "hi there"),
+        ("  .-  ", "a"),
+        (".- ......... -...", f"a{UNKNOWN}b"),
+        ("...---... .-.-.", "<SOS><AR>"),
+    ],
+)
+def test_from_morse(code, expected):
+    assert functions.from_morse(code) == expected
+
+
+def test_morse_streaming():
+    text = "the quick brown fox jumps over the lazy dog 1234567890"
+    chunks = (text[i : i + 3] for i in range(0, len(text), 3))
+    code = "".join(MORSE.encode(chunks))
+    assert code == functions.to_morse(text)
+
+    code_chunks = (code[i : i + 5] for i in range(0, len(code), 5))
+    assert "".join(MORSE.decode(code_chunks)) == text
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("... --- ...", True),
+        (".- / -...", True),
+        ("", False),
+        ("   ", False),
+        ("sos", False),
+    ],
+)
+def test_is_morse(text, expected):
+    assert functions.is_morse(text) is expected
+
+
+def test_morse_helper_roundtrip():
+    assert functions.morse_helper(functions.morse_helper("hello world")) == "hello world"
+
+
+def test_morse_streaming_prosign_across_chunks():
+    chunks = iter(["hi <s", "o", "s> <a", "r"])
+    assert "".join(MORSE.encode(chunks)) == ".... ..   ...---...   .- .-."
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from peon_common import scheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    clock = Clock()
+    bucket = scheduler.TokenBucket(60, clock)
+
+    assert bucket.delay(60) == 0
+    bucket.consume(90)
+    assert bucket.delay(1) == 31
+    clock.now = 31
+    assert bucket.delay(1) == 0
+    assert bucket.delay(1000) == 59
+    clock.now = 1000
+    assert bucket.delay(60) == 0 and bucket.level == 60
+
+
+def test_round_robin():
+    order = []
+    queued = []
+
+    async def request(fair, owner_id, name):
+        async def on_queued():
+            queued.append(name)
+
+        async with fair.slot(owner_id, 1, on_queued):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        fair = scheduler.FairScheduler(max_concurrent=1)
+        busy = [request(fair, "guild1", f"a{i}") for i in range(4)]
+        await asyncio.gather(*busy, request(fair, "guild2", "b0"))
+        return fair
+
+    fair = asyncio.run(run())
+
+    assert order == ["a0", "a1", "b0", "a2", "a3"]
+    assert queued == ["a1", "a2", "a3", "b0"]
+    assert fair.active == 0 and fair.queued == 0
+
+
+@pytest.mark.parametrize("used, delayed", [(None, True), (300, False)])
+def test_token_budget(used, delayed):
+    started = {}
+
+    async def run():
+        fair = scheduler.FairScheduler(tokens_per_minute=600)
+        async with fair.slot("guild1", 600) as ticket:
+            ticket.record(used)
+        start = time.monotonic()
+        async with fair.slot("guild2", 6):
+            started["delay"] = time.monotonic() - start
+
+    asyncio.run(run())
+
+    assert (started["delay"] >= 0.5) is delayed
+
+
+def test_cancelled_request():
+    async def run():
+        fair = scheduler.FairScheduler(max_concurrent=1)
+        async with fair.slot("guild1", 1):
+            waiting = asyncio.create_task(fair.slot("guild1", 1).__aenter__())
+            await asyncio.sleep(0)
+            assert fair.queued == 1
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert fair.queued == 0
+        return fair
+
+    fair = asyncio.run(run())
+
+    assert fair.active == 0
+
+
+def test_charge():
+    clock = Clock()
+    fair = scheduler.FairScheduler(
+        requests_per_minute=60, tokens_per_minute=600, clock=clock
+    )
+
+    fair.charge(900)
+    assert fair.requests.level == 59
+    assert fair.tokens.delay(600) == 90
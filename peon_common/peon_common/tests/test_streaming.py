@@ -0,0 +1,49 @@
+import asyncio
+
+from peon_common import streaming
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def chunks(clock, items):
+    for delay, chunk in items:
+        clock.now += delay
+        yield chunk
+
+
+def test_progressive_edit():
+    clock = Clock()
+    edits = []
+
+    async def edit(text, final):
+        edits.append((clock.now, text, final))
+
+    items = [(0.25, "a"), (0.25, "b"), (0.5, "c"), (0.5, " "), (1, "d"), (0.25, "e")]
+    text = asyncio.run(
+        streaming.progressive_edit(chunks(clock, items), edit, interval=1, clock=clock)
+    )
+
+    assert text == "abc de"
+    assert edits == [
+        (0.25, "a", False),
+        (1.5, "abc ", False),
+        (2.5, "abc d", False),
+        (2.75, "abc de", True),
+    ]
+
+
+def test_progressive_edit_empty():
+    edits = []
+
+    async def edit(text, final):
+        edits.append((text, final))
+
+    assert asyncio.run(streaming.progressive_edit(chunks(Clock(), []), edit)) == ""
+    assert edits == [("", True)]
+
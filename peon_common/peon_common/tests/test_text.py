@@ -0,0 +1,90 @@
+import pytest
+
+from peon_common import functions, text
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("", ""),
+        ("Привет, Мир! 123", "привет мир "),
+        ("ёжик [test]_+=", "ежик теsт"),
+        ("What?! ~*pOp*~", "wнат рор"),
+    ],
+)
+def test_normalize_simple_mask(value, expected):
+    assert (
+        functions.normalize_text(value, simple_mask=True, do_de_latinize=True)
+        == expected
+    )
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("}{ey", "хey"),
+        ("IIIIII()", "шшo"),
+        ("*bold* _it_ ~strike~", "bold it strike"),
+    ],
+)
+def test_normalize_special_and_markdown(value, expected):
+    assert (
+        functions.normalize_text(value, special_chars=True, markdown=True) == expected
+    )
+
+
+def test_charmap_composition():
+    first = text.CharMap({"a": "bb", "c": None})
+    second = text.CharMap({"b": "x", "d": "y"})
+    chained = text.Transform(first, second)
+
+    assert len(chained.steps) == 1
+    assert chained("abcd") == "xxxy"
+    assert chained("abcd") == second(first("abcd"))
+
+
+def test_sequence_map_prefers_longer():
+    seq = text.SequenceMap({"ab": "1", "abc": "2"})
+    assert seq("abcab") == "21"
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("ghbdtn", "привет"),
+        ("руддщ", "hello"),
+        ("", ""),
+    ],
+)
+def test_punto(value, expected):
+    assert functions.punto(value) == expected
+
+
+def test_translitify():
+    assert functions.translitify("щука и ёж!") == "sh'uka i ezh!"
+
+
+@pytest.mark.parametrize(
+    ("triggers", "value", "expected"),
+    [
+        (["he", "she", "his", "hers"], "ushers", ["he", "she", "hers"]),
+        (["abc", "bcd", "c"], "xbcdx", ["bcd", "c"]),
+        (["peon", ""], "nothing", [""]),
+        (["aaa", "aa"], "aa", ["aa"]),
+    ],
+)
+@pytest.mark.parametrize("scan_limit", [0, text.TriggerMatcher.SCAN_LIMIT])
+def test_trigger_matcher(triggers, value, expected, scan_limit):
+    matcher = text.TriggerMatcher(triggers, scan_limit=scan_limit)
+    assert matcher.matches(value) == expected
+
+
+def test_find_simple_replies(monkeypatch):
+    collection = {"привет": [100, ["hi"]], "пока": [100, ["bye"]]}
+    monkeypatch.setattr(functions, "simple_replies_collection", collection)
+
+    assert functions.find_simple_replies("ну пока, привет") == list(collection.items())
+    assert functions.find_simple_replies("ничего") == []
+
+    functions.set_simple_replies({"ничего": [5, []]})
+    assert functions.find_simple_replies("ничего") == [("ничего", [5, []])]
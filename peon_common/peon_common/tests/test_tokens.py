@@ -0,0 +1,47 @@
+import mock
+import pytest
+
+from peon_common import tokens
+
+
+@pytest.fixture(autouse=True)
+def heuristic():
+    with mock.patch.object(tokens, "encoding", return_value=None):
+        yield
+
+
+def message(role, length):
+    return {"role": role, "content": "x" * length}
+
+
+def test_count_tokens():
+    assert tokens.count_tokens("", "model") == 0
+    assert tokens.count_tokens("abcdefgh", "model") == 2
+    assert tokens.count_tokens("ежик", "model") == 2
+    assert tokens.message_tokens(message("user", 40), "model") == 13
+
+
+@pytest.mark.parametrize(
+    "budget, expected_history",
+    [
+        (1000, 5),
+        (29 + 32, 4),
+        (29 + 31, 2),
+        (29 + 15, 0),
+        (1, 0),
+    ],
+)
+def test_build_context(budget, expected_history):
+    system, prompt = message("system", 40), message("user", 40)
+    # 29 tokens for system and prompt, odd leading message followed by two
+    # user/assistant pairs, 8 tokens per message
+    history = [message("assistant", 20)] + [
+        message(role, 20) for _ in range(2) for role in ("user", "assistant")
+    ]
+
+    window = tokens.build_context(system, history, prompt, "model", budget)
+
+    assert window.messages[0] is system and window.messages[-1] is prompt
+    assert window.messages[1:-1] == history[len(history) - expected_history :]
+    assert window.history_dropped == len(history) - expected_history
+    assert window.tokens == 29 + 8 * expected_history
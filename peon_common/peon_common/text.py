@@ -0,0 +1,229 @@
+"""Precompiled text transformations.
+
+Character maps are compiled once into a deletion pattern plus `str.replace`
+chain (or a `str.maketrans` table when replacements would cascade), and
+multi-char replacements into a single alternation pattern. Adjacent character
+maps in a `Transform` are folded into one map, so a chain of maps is applied
+as a single step; every sequence map is a separate regex pass.
+"""
+
+import functools
+import re
+from typing import Callable, Iterable, Self
+
+
+class CharMap:
+    """Single character replacement table.
+
+    Values may be strings of any length, `None` or an empty string deletes
+    the character.
+
+    CPython's `str.translate` falls back to a per-character dict lookup for
+    non-ASCII text, which is slower than a handful of C-level `str.replace`
+    scans on short chat messages. Deletions are therefore done with a single
+    character class pattern and replacements with a `str.replace` chain,
+    unless a replacement value contains another key (in which case chained
+    replaces would cascade and the `str.maketrans` table is used instead).
+    """
+
+    def __init__(self, mapping: dict = None, delete: Iterable[str] = "") -> Self:
+        self.mapping = {k: v or "" for k, v in (mapping or {}).items()}
+        for char in delete:
+            self.mapping[char] = ""
+
+        if any(len(k) != 1 for k in self.mapping):
+            raise ValueError("CharMap keys must be single characters")
+
+        self.table = str.maketrans(self.mapping)
+        self.replacements = [(k, v) for k, v in self.mapping.items() if v]
+        deleted = "".join(k for k, v in self.mapping.items() if not v)
+        self.deletions = re.compile(f"[{re.escape(deleted)}]") if deleted else None
+        self.cascading = any(
+            k in v for k in self.mapping for _, v in self.replacements
+        )
+
+    def __call__(self, text: str) -> str:
+        if self.cascading:
+            return text.translate(self.table)
+        if self.deletions:
+            text = self.deletions.sub("", text)
+        for k, v in self.replacements:
+            text = text.replace(k, v)
+        return text
+
+    def then(self, other: Self) -> Self:
+        """Compose two maps into one, applying `self` first."""
+
+        composed = {k: other(v) for k, v in self.mapping.items()}
+        for k, v in other.mapping.items():
+            composed.setdefault(k, v)
+        return CharMap(composed)
+
+
+class SequenceMap:
+    """Multi-character replacement, compiled into one alternation pattern.
+
+    Longer sequences take precedence over their prefixes.
+    """
+
+    def __init__(self, mapping: dict) -> Self:
+        self.mapping = dict(mapping)
+        keys = sorted(self.mapping, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(k) for k in keys))
+
+    def __call__(self, text: str) -> str:
+        return self.pattern.sub(lambda m: self.mapping[m.group()], text)
+
+
+class Transform:
+    """Chain of text transformation steps, executed in order.
+
+    Steps are `CharMap`, `SequenceMap` or any `str -> str` callable
+    (e.g. `str.lower`).
+    """
+
+    def __init__(self, *steps: Callable[[str], str]) -> Self:
+        self.steps = []
+        for step in steps:
+            if isinstance(step, Transform):
+                self._extend(step.steps)
+            else:
+                self._extend([step])
+
+    def _extend(self, steps):
+        for step in steps:
+            if (
+                isinstance(step, CharMap)
+                and self.steps
+                and isinstance(self.steps[-1], CharMap)
+            ):
+                self.steps[-1] = self.steps[-1].then(step)
+            else:
+                self.steps.append(step)
+
+    def __call__(self, text: str) -> str:
+        for step in self.steps:
+            text = step(text)
+        return text
+
+    def then(self, *steps: Callable[[str], str]) -> Self:
+        return Transform(self, *steps)
+
+
+SIMPLE_MASK = CharMap(
+    {"ё": "е"},
+    delete="^$!#%&€£¢¥§<>?~*,0123456789:;[]=-+_",
+)
+"""Characters dropped from messages before keyword matching."""
+
+DE_LATINIZE = CharMap(
+    {
+        "e": "е",
+        "t": "т",
+        "y": "у",
+        "o": "о",
+        "p": "р",
+        "a": "а",
+        "h": "н",
+        "k": "к",
+        "x": "х",
+        "c": "с",
+        "b": "в",
+        "m": "м",
+    }
+)
+"""Latin characters resembling cyrillic ones."""
+
+SPECIAL_CHARACTERS = SequenceMap({"}{": "х", "III": "ш", "()": "o"})
+"""Complex character sequences resembling single characters."""
+
+MARKDOWN = CharMap(delete="*_~")
+"""Markdown emphasis characters."""
+
+
+@functools.lru_cache(maxsize=None)
+def normalizer(
+    simple_mask=False, do_de_latinize=False, special_chars=False, markdown=False
+) -> Transform:
+    """Build a compiled normalization chain for the given flags."""
+
+    steps = []
+    if simple_mask:
+        steps += [str.lower, SIMPLE_MASK]
+    if do_de_latinize:
+        steps.append(DE_LATINIZE)
+    if special_chars:
+        steps.append(SPECIAL_CHARACTERS)
+    if markdown:
+        steps.append(MARKDOWN)
+    return Transform(*steps)
+
+
+class TriggerMatcher:
+    """Aho-Corasick automaton finding every trigger contained in a text.
+
+    Built once per trigger set; matching is a single pass over the text,
+    so its cost does not depend on the number of triggers. Below `scan_limit`
+    triggers, C-level substring checks are still cheaper than the Python
+    level automaton walk and are used instead.
+    """
+
+    SCAN_LIMIT = 100
+    """Trigger count below which plain substring checks are used."""
+
+    def __init__(self, triggers: Iterable[str], scan_limit: int = SCAN_LIMIT) -> Self:
+        self.triggers = list(triggers)
+        self.scan = len(self.triggers) < scan_limit
+        self.transitions = [{}]
+        self.outputs = [set()]
+        fail = [0]
+
+        for index, trigger in enumerate(self.triggers):
+            state = 0
+            for char in trigger:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.outputs.append(set())
+                    fail.append(0)
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            self.outputs[state].add(index)
+
+        queue = list(self.transitions[0].values())
+        for state in queue:
+            for char, target in self.transitions[state].items():
+                queue.append(target)
+                fallback = fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = fail[fallback]
+                fail[target] = self.transitions[fallback].get(char, 0)
+                self.outputs[target] |= self.outputs[fail[target]]
+
+        self.fail = fail
+        self.outputs = [frozenset(output) for output in self.outputs]
+
+    def find(self, text: str) -> list[int]:
+        """Return sorted indices of triggers found in text."""
+
+        if self.scan:
+            return [i for i, trigger in enumerate(self.triggers) if trigger in text]
+
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+        found = set(outputs[0])
+        state = 0
+
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+
+        return sorted(found)
+
+    def matches(self, text: str) -> list[str]:
+        """Return triggers found in text, in the order they were registered."""
+
+        return [self.triggers[index] for index in self.find(text)]
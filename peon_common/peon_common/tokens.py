@@ -0,0 +1,92 @@
+"""GPT token counting and token-budgeted context assembly."""
+
+import functools
+import logging
+import math
+from dataclasses import dataclass, field
+
+from .utils import APP_NAME
+
+
+LOG = logging.getLogger(APP_NAME)
+
+MESSAGE_OVERHEAD = 3
+"""Tokens spent on every chat message besides its content (role, separators)."""
+
+REPLY_OVERHEAD = 3
+"""Tokens priming the assistant reply."""
+
+FALLBACK_ENCODING = "o200k_base"
+"""Encoding used for models unknown to tiktoken."""
+
+BYTES_PER_TOKEN = 4
+"""Approximation used when tiktoken is not available."""
+
+
+@functools.lru_cache(maxsize=None)
+def encoding(model: str):
+    """Tokenizer for model (`None` if tiktoken is not installed)."""
+
+    try:
+        import tiktoken
+    except ImportError:
+        LOG.warning("tiktoken is not installed, token counts are approximated")
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, model: str) -> int:
+    if (enc := encoding(model)) is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def message_tokens(message: dict, model: str) -> int:
+    return MESSAGE_OVERHEAD + count_tokens(message["content"], model)
+
+
+@dataclass
+class ContextWindow:
+    """Messages selected for a request and their token count."""
+
+    messages: list[dict]
+    tokens: int
+    history_dropped: int = 0
+    """History messages left out due to token budget."""
+    timings: dict[str, float] = field(default_factory=dict)
+    """Seconds spent on context assembly steps (history fetch, intents)."""
+
+
+def build_context(
+    system: dict,
+    history: list[dict],
+    prompt: dict,
+    model: str,
+    budget: int,
+) -> ContextWindow:
+    """Pack system message, newest history and prompt into token budget.
+
+    System message and prompt are always included; history is added from
+    the newest exchange backwards while it fits, keeping user/assistant
+    pairs together.
+    """
+
+    tokens = (
+        message_tokens(system, model) + message_tokens(prompt, model) + REPLY_OVERHEAD
+    )
+    selected = []
+    end = len(history)
+    while end > 0:
+        pair = history[max(end - 2, 0) : end]
+        pair_tokens = sum(message_tokens(message, model) for message in pair)
+        if tokens + pair_tokens > budget:
+            break
+        tokens += pair_tokens
+        selected[:0] = pair
+        end -= len(pair)
+
+    return ContextWindow([system, *selected, prompt], tokens, history_dropped=end)
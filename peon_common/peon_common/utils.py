@@ -13,6 +13,7 @@ ENV_TOKEN_OPENAI = "openai_token"
 ENV_TWITCH_CLIENT_ID = "twitch_client_id"
 ENV_TWITCH_CLIENT_SECRET = "twitch_client_secret"
 ENV_TELEGRAM_ADMINS = "telegram_admins"
+ENV_WIKI_LANGUAGES = "wiki_languages"
 ENV_DB_ENABLED = "DB_ENABLED"
 ENV_DB_HOST = "MONGO_HOST"
 ENV_DB_PORT = "MONGO_PORT"
@@ -6,6 +6,8 @@ from datetime import datetime
 
 from . import commands, CommandSet, Command, MentionHandler
 from peon_common.db import initialize_db
+from peon_common.gpt import HISTORY_COMPACTOR
+from peon_common.metrics import GPT_METRICS
 from peon_common.utils import (
     get_env_vars,
     get_file,
@@ -52,11 +54,17 @@ class Peon():
             Command("roll", commands.cmd_roll,
                     description="roll dice",
                     examples=["{0} d4", "{0} 2d8", "{0} 100",
-                              "{0} 42-59", "{0} 2d5+100+4d4"]),
+                              "{0} 42-59", "{0} 2d5+100+4d4", "{0} 1000d6"]),
+            Command("odds", commands.cmd_odds,
+                    description="exact dice probabilities",
+                    examples=["{0} 3d6+2d4 >= 14", "{0} 100d6"]),
             Command("starify", commands.cmd_starify,
                     description="write mystical stuff on night sky",
                     examples=["{0} each minute a minute passes"]),
             Command("slot", commands.cmd_slot, description="test your luck"),
+            Command("ascii", commands.cmd_ascii,
+                    description="turn attached image, emoji or avatar into ASCII art",
+                    examples=["{0}", "{0} @user", "{0} :emoji:"]),
             Command("wiki", commands.cmd_wiki,
                     description="query wiki", examples=["{0} nuclear fission"]),
             Command("urban", commands.cmd_urban,
@@ -88,6 +96,8 @@ class Peon():
         """Initialize/run discord client."""
 
         initialize_db()
+        HISTORY_COMPACTOR.start()
+        GPT_METRICS.start()
 
         self._client = discord.Client(status="work-work",
                                       activity=discord.CustomActivity("work-work"),
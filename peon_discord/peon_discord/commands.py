@@ -1,8 +1,10 @@
 """Command model, definitions and command/handler sets for discord client."""
 
+import asyncio
 import os
 import random
 import re
+import requests
 import time
 from abc import abstractmethod
 from datetime import datetime
@@ -12,6 +14,7 @@ from discord.enums import ChannelType
 from peon_common import (
     exceptions,
     functions,
+    streaming,
     utils,
 )
 from peon_common.gpt import Completion
@@ -26,6 +29,24 @@ CMD_SIGNS = [CMD_SIGN] + ALTERNATIVE_CMD_SIGNS
 SENDER_PATTERN = r"^\[\[\w+\]\([\w:\/\-\.\#\!]+\)\]:\s"
 """A regexp pattern for messages that contain sender hyperlink."""
 
+CUSTOM_EMOJI_PATTERN = r"<(?P<animated>a?):\w+:(?P<id>\d+)>"
+"""A regexp pattern for custom emojis in message content."""
+
+EMOJI_URL = "https://cdn.discordapp.com/emojis/{0}.png"
+"""Custom emoji image URL template."""
+
+MSG_MAX_CHARACTERS = 2000
+"""Maximum amount of characters supported in a message."""
+
+GPT_PLACEHOLDER = "..."
+"""Message posted while GPT reply is being streamed."""
+
+GPT_EDIT_INTERVAL = 1.2
+"""Seconds between streamed GPT reply edits (discord allows 5 edits per 5s)."""
+
+GPT_QUEUED_REACTION = "⏳"
+"""Reaction added to requests waiting for their turn (busy, queued)."""
+
 GENERIC_GRATS = [
     "Congratulations!",
     "wow, unbelievable",
@@ -43,12 +64,19 @@ def mention_format(user_id):
     return f"<@{user_id}>"
 
 
+def truncate(text):
+    """Shorten text to fit into a single message."""
+
+    if isinstance(text, str) and len(text) > MSG_MAX_CHARACTERS:
+        return f"{text[:MSG_MAX_CHARACTERS - 4]}..."
+    return text
+
+
 async def reply(message, text, mention_message=False):
     """Reply to the message with text (returns new message object)."""
 
     if text:
-        if isinstance(text, str) and len(text) > 2000:
-            text = f"{text[:1996]}..."
+        text = truncate(text)
         return await message.channel.send(
             text,
             reference=message if mention_message else None,
@@ -62,12 +90,10 @@ async def handle_simple_replies(message, **kwargs):
         message.content, simple_mask=True, do_de_latinize=True
     )
 
-    for k, v in functions.simple_replies_collection.items():
-        if k in payload:
-            chance, phrases = v
-            if len(phrases) > 0 and chance >= random.randint(0, 100):
-                await reply(message, random.choice(phrases))
-                return True
+    for _, (chance, phrases) in functions.find_simple_replies(payload):
+        if len(phrases) > 0 and chance >= random.randint(0, 100):
+            await reply(message, random.choice(phrases))
+            return True
 
     return False
 
@@ -150,6 +176,20 @@ async def cmd_roll(message, content, **kwargs):
         raise e
 
 
+async def cmd_odds(message, content, **kwargs):
+    """Dice probabilities (approximate, marked with ≈, for huge pools).
+
+    Uses `!roll` dice notation, optionally compared to a number:
+        !odds 3d6+2d4 >= 14 - chance for a total of 14 or more
+        !odds 100d6 - percentiles of the total
+    """
+
+    if not content:
+        raise Exception("Content required")
+
+    await reply(message, await asyncio.to_thread(functions.odds, content))
+
+
 async def cmd_starify(message, content, **kwargs):
     """Generate string resemblint star sky with ASCII symbols and spread text evenly."""
 
@@ -187,6 +227,36 @@ async def cmd_slot(message, content, **kwargs):
         )
 
 
+async def cmd_ascii(message, content, **kwargs):
+    """Render an image as ASCII art.
+
+    Image source, in order of precedence: message attachment, custom emoji
+    in message content, mentioned user's avatar, author's avatar.
+    """
+
+    if message.attachments:
+        data = await message.attachments[0].read()
+    elif emoji := re.search(CUSTOM_EMOJI_PATTERN, content or ""):
+        known = kwargs["client"].client.get_emoji(int(emoji.group("id")))
+        if known:
+            data = await known.read()
+        else:
+            response = await asyncio.to_thread(
+                requests.get, EMOJI_URL.format(emoji.group("id")), timeout=5
+            )
+            if not response.ok:
+                raise exceptions.CommandExecutionError("Unable to fetch emoji")
+            data = response.content
+    else:
+        user = message.mentions[0] if message.mentions else message.author
+        data = await user.display_avatar.with_static_format("png").read()
+
+    art = await asyncio.to_thread(
+        functions.image_to_ascii, data, limit=MSG_MAX_CHARACTERS - len("```\n```")
+    )
+    await reply(message, f"```\n{art}```")
+
+
 async def cmd_wiki(message, content, **kwargs):
     """Query wikipedia and return results.
 
@@ -247,7 +317,7 @@ async def cmd_mangle(message, content, **kwargs):
 async def cmd_doc(message, content, **kwargs):
     """Eliza psychotherapist hotline."""
 
-    await reply(message, functions.doc(content))
+    await reply(message, functions.doc(content, owner_id=message.author.id))
 
 
 async def cmd_morse(message, content, **kwargs):
@@ -326,21 +396,48 @@ async def cmd_gpt(message, content, **kwargs):
             raise Exception("Unsupported channel type")
 
     print(f"DEBUG: handling GPT request: '{content}'")
+    placeholder = await reply(message, GPT_PLACEHOLDER, mention_message=True)
+
+    queued = False
+
+    async def on_queued():
+        nonlocal queued
+        queued = True
+        await message.add_reaction(GPT_QUEUED_REACTION)
+
+    async def dequeued():
+        nonlocal queued
+        if queued:
+            queued = False
+            try:
+                await message.remove_reaction(
+                    GPT_QUEUED_REACTION, kwargs["client"].client.user
+                )
+            except Exception as e:
+                print(f"DEBUG: failed to remove queued reaction: {str(e)}")
+
+    async def edit(text, final):
+        await dequeued()
+        await placeholder.edit(content=truncate(text) or GPT_PLACEHOLDER)
+
     try:
-        answer = Completion().request(
+        chunks = Completion().astream(
             sanitize_gpt_request(message.content, mention),
             owner_id=str(chat_owner_id),
             use_history=True,
-            history_limit=3,
             handle_intents=True,
+            on_queued=on_queued,
+        )
+        answer = await streaming.progressive_edit(
+            chunks, edit, interval=GPT_EDIT_INTERVAL
         )
     except Exception as e:
         print(f"DEBUG: Completion error: {str(e)}")
-        await reply(message, "something went wrong ;(", mention_message=True)
+        await dequeued()
+        await placeholder.edit(content="something went wrong ;(")
         return True
     print(f"DEBUG: reply: '{answer}'")
 
-    await reply(message, answer, mention_message=True)
     return True
 
 
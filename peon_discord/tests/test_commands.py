@@ -1,6 +1,11 @@
 """Common-related test cases."""
 
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
 import pytest
+from discord.enums import ChannelType
 
 import peon_discord.commands as commands
 
@@ -22,3 +27,87 @@ MENTION_STUB = "<@123>"
 )
 def test_sanitize_gpt_request(text, expected):
     assert commands.sanitize_gpt_request(text, MENTION_STUB) == expected
+
+
+class FakeMessage:
+    def __init__(self, content=None):
+        self.content = content
+        self.edits = []
+
+    async def edit(self, content=None, **kwargs):
+        self.edits.append(content)
+        self.content = content
+
+
+def gpt_message(content, sent):
+    async def send(text, **kwargs):
+        sent.append(FakeMessage(text))
+        return sent[-1]
+
+    async def add_reaction(emoji):
+        sent.append(("add", emoji))
+
+    async def remove_reaction(emoji, member):
+        sent.append(("remove", emoji, member.id))
+
+    return SimpleNamespace(
+        content=content,
+        author=SimpleNamespace(id=7, mention=MENTION_STUB),
+        channel=SimpleNamespace(type=ChannelType.private, send=send),
+        add_reaction=add_reaction,
+        remove_reaction=remove_reaction,
+    )
+
+
+@pytest.mark.parametrize(
+    ("chunks", "expected"),
+    [
+        (["work ", "work"], "work work"),
+        (
+            ["zug " * 400, "zug " * 200],
+            f"{('zug ' * 600)[:commands.MSG_MAX_CHARACTERS - 4]}...",
+        ),
+    ],
+)
+def test_cmd_gpt(chunks, expected):
+    client = SimpleNamespace(client=SimpleNamespace(user=SimpleNamespace(id=123)))
+    sent = []
+    message = gpt_message(f"{MENTION_STUB} say something", sent)
+
+    async def astream(*args, **kwargs):
+        for chunk in chunks:
+            yield chunk
+
+    with mock.patch.object(commands, "Completion") as completion:
+        completion.return_value.astream = astream
+        handled = asyncio.run(commands.cmd_gpt(message, message.content, client=client))
+
+    assert handled is True
+    placeholder, = sent
+    assert placeholder.edits[0] != commands.GPT_PLACEHOLDER
+    assert placeholder.content == expected
+    assert all(len(text) <= commands.MSG_MAX_CHARACTERS for text in placeholder.edits)
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_cmd_gpt_queued(fail):
+    client = SimpleNamespace(client=SimpleNamespace(user=SimpleNamespace(id=123)))
+    sent = []
+    message = gpt_message(f"{MENTION_STUB} say something", sent)
+
+    async def astream(*args, on_queued, **kwargs):
+        await on_queued()
+        if fail:
+            raise Exception("upstream error")
+        yield "zug zug"
+
+    with mock.patch.object(commands, "Completion") as completion:
+        completion.return_value.astream = astream
+        asyncio.run(commands.cmd_gpt(message, message.content, client=client))
+
+    placeholder, *reactions = sent
+    assert reactions == [
+        ("add", commands.GPT_QUEUED_REACTION),
+        ("remove", commands.GPT_QUEUED_REACTION, 123),
+    ]
+    assert placeholder.content == ("something went wrong ;(" if fail else "zug zug")
@@ -3,6 +3,8 @@
 import logging
 
 from .handlers import HANDLERS
+from peon_common.gpt import HISTORY_COMPACTOR
+from peon_common.metrics import GPT_METRICS, HOST_METRICS
 from peon_common.utils import ENV_TOKEN_TELEGRAM, get_env_vars
 from telegram import Update
 from telegram.ext import ApplicationBuilder
@@ -18,10 +20,16 @@ class Peon:
 
     def run(self):
         self.APPLICATION = (
-            ApplicationBuilder().token(self.ENV_VARS[ENV_TOKEN_TELEGRAM]).build()
+            ApplicationBuilder()
+            .token(self.ENV_VARS[ENV_TOKEN_TELEGRAM])
+            .concurrent_updates(True)
+            .build()
         )
 
         for handler in HANDLERS:
             self.APPLICATION.add_handler(handler)
 
+        HOST_METRICS.start()
+        HISTORY_COMPACTOR.start()
+        GPT_METRICS.start()
         self.APPLICATION.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -1,5 +1,6 @@
 """Peon handlers."""
 
+import asyncio
 import functools
 import logging
 import os
@@ -8,6 +9,7 @@ import re
 from peon_common import (
     exceptions,
     functions,
+    streaming,
     utils,
 )
 from peon_common.exceptions import (
@@ -16,6 +18,7 @@ from peon_common.exceptions import (
     CommandMalformed,
 )
 from peon_common.gpt import Completion
+from peon_common.metrics import GPT_METRICS
 from peon_common.utils import logger
 from peon_telegram import constants
 
@@ -25,6 +28,7 @@ from telegram import (
     InputTextMessageContent,
     Update,
 )
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
     CommandHandler,
     ContextTypes,
@@ -45,6 +49,18 @@ MARKDOWN_PARSE_MODE = tgconstants.ParseMode.MARKDOWN
 INLINE_HANDLER_SPECIAL_CHAR = "&"
 """Character that works as a signal for inline query to compute results."""
 
+STREAM_PLACEHOLDER = "..."
+"""Message posted while streamed reply is being received."""
+
+STREAM_QUEUED = "⏳ busy, queued..."
+"""Placeholder text shown while the request waits for its turn."""
+
+STREAM_EDIT_INTERVAL = 1.5
+"""Seconds between streamed reply edits (telegram allows ~1 message per second)."""
+
+STREAM_FINAL_EDIT_ATTEMPTS = 3
+"""Rate limited final edits after which the reply is sent as a new message."""
+
 ICON_URL_WRITING = "https://cdn-icons-png.flaticon.com/128/2554/2554282.png"
 ICON_URL_TEXT = "https://cdn-icons-png.flaticon.com/128/2521/2521903.png"
 """Various icon URLs."""
@@ -81,8 +97,13 @@ def default_handler(
     examples: list[str] = None,
     reply: bool = False,
     admin: bool = False,
+    blocking: bool = False,
 ):
-    """Basic handler wrapper."""
+    """Basic handler wrapper.
+
+    With `blocking` the callable runs in a worker thread (CPU heavy commands
+    would otherwise hold up the event loop).
+    """
 
     def decorator(callable):
         # TODO: replace underscores with dashes in callable.__name__?
@@ -104,9 +125,15 @@ def default_handler(
                 if require_input and not text:
                     raise CommandMalformed()
 
+                if blocking:
+                    res = await asyncio.to_thread(
+                        callable, text, **gather_context(update)
+                    )
+                else:
+                    res = callable(text, **gather_context(update))
                 await context.bot.send_message(
                     chat_id=update.effective_chat.id,
-                    text=sanitize_markdown(callable(text, **gather_context(update))),
+                    text=sanitize_markdown(res),
                     reply_to_message_id=update.message.id if reply else None,
                     parse_mode=MARKDOWN_PARSE_MODE,
                 )
@@ -195,10 +222,149 @@ def inline_handler(callable):
     HANDLERS.append(InlineQueryHandler(wrapper))
 
 
+async def fetch_image(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bytes:
+    """Fetch replied-to photo, or sender's profile photo if there is none."""
+
+    replied = update.message.reply_to_message
+    if replied and replied.photo:
+        photo = replied.photo[-1]
+    elif replied and replied.sticker and not (
+        replied.sticker.is_animated or replied.sticker.is_video
+    ):
+        photo = replied.sticker
+    else:
+        photos = await context.bot.get_user_profile_photos(
+            update.effective_user.id, limit=1
+        )
+        if not photos.photos:
+            raise CommandMalformed("No image found")
+        photo = photos.photos[0][-1]
+
+    file = await context.bot.get_file(photo.file_id)
+    return bytes(await file.download_as_bytearray())
+
+
+def image_handler(command_override: str = None, reply: bool = True):
+    """Handler wrapper for commands working on images (see `fetch_image`).
+
+    Image processing runs in a worker thread.
+    """
+
+    def decorator(callable):
+        command = command_override or callable.__name__
+        LOG.debug(f"registering image handler: {command}")
+
+        @functools.wraps(callable)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            try:
+                LOG.info(f"({update.effective_user.name}) '{command}' (image)")
+                data = await fetch_image(update, context)
+                text = await asyncio.to_thread(
+                    callable, data, **gather_context(update)
+                )
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=text,
+                    reply_to_message_id=update.message.id if reply else None,
+                    parse_mode=MARKDOWN_PARSE_MODE,
+                )
+            except (CommandMalformed, CommandExecutionError) as e:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text="No usable image (reply to a photo or set a profile photo).",
+                    reply_to_message_id=update.message.id,
+                )
+                LOG.warning(str(e))
+            except Exception as e:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=f"Caught error:\n```{e}```" if constants.DEBUG else "😫",
+                    parse_mode=MARKDOWN_PARSE_MODE,
+                    reply_to_message_id=update.message.id,
+                )
+                raise e
+
+        HANDLERS.append(CommandHandler(command, wrapper))
+
+    return decorator
+
+
+def split_message(text: str, size: int = 4000) -> list[str]:
+    return [text[i : i + size] for i in range(len(text))[::size]]
+
+
+async def stream_reply(update: Update, context: ContextTypes.DEFAULT_TYPE, stream):
+    """Post a placeholder and progressively edit it with streamed text.
+
+    `stream(on_queued=...)` returns the chunks; the placeholder reports
+    backpressure when the request has to wait for its turn.
+    """
+
+    placeholder = await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=STREAM_PLACEHOLDER,
+        reply_to_message_id=update.message.id,
+    )
+
+    async def on_queued():
+        await placeholder.edit_text(STREAM_QUEUED)
+
+    async def edit(text, final):
+        parts = split_message(text) or [STREAM_PLACEHOLDER]
+        if not final:
+            # partial text may contain unbalanced markdown, so it is sent as is;
+            # skipped edits (rate limits) are caught up with by the next one
+            try:
+                await placeholder.edit_text(parts[0])
+            except (BadRequest, RetryAfter):
+                pass
+            return
+
+        for _ in range(STREAM_FINAL_EDIT_ATTEMPTS):
+            try:
+                await placeholder.edit_text(
+                    sanitize_markdown(parts[0]), parse_mode=MARKDOWN_PARSE_MODE
+                )
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except BadRequest as e:
+                if "not modified" not in str(e):
+                    await placeholder.edit_text(parts[0])
+                break
+        else:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=sanitize_markdown(parts[0]),
+                reply_to_message_id=update.message.id,
+                parse_mode=MARKDOWN_PARSE_MODE,
+            )
+
+        for part in parts[1:]:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=sanitize_markdown(part),
+                reply_to_message_id=update.message.id,
+                parse_mode=MARKDOWN_PARSE_MODE,
+            )
+
+    await streaming.progressive_edit(
+        stream(on_queued=on_queued), edit, interval=STREAM_EDIT_INTERVAL
+    )
+
+
 def direct_message_handler(
     admin: bool = False,
     reply: bool = False,
+    stream: bool = False,
 ):
+    """Direct message handler wrapper.
+
+    With `stream` the callable returns an async iterator of text chunks, which are
+    delivered through progressive edits of a single reply (the callable also gets
+    `on_queued` coroutine function to report a delayed start).
+    """
+
     def decorator(callable):
         LOG.debug(f"Registering direct message handler: '{callable.__name__}'")
 
@@ -211,8 +377,15 @@ def direct_message_handler(
                         f"({update.effective_user.name}) handling direct message: '{text}'"
                     )
 
+                    if stream:
+                        chunks = functools.partial(
+                            callable, text, **gather_context(update)
+                        )
+                        await stream_reply(update, context, chunks)
+                        return
+
                     res = sanitize_markdown(callable(text, **gather_context(update)))
-                    for chunk in [res[i : i + 4000] for i in range(len(res))[::4000]]:
+                    for chunk in split_message(res):
                         await context.bot.send_message(
                             chat_id=update.effective_chat.id,
                             text=chunk,
@@ -242,11 +415,22 @@ def help(text, **kwargs):
     return "help?!"
 
 
-@default_handler(require_input=True, examples=["d4", "2d8 + d12", "100", "12-80"])
+@default_handler(
+    require_input=True, examples=["d4", "2d8 + d12", "100", "12-80", "1000d6"]
+)
 def roll(text, **kwargs):
     return f"{text}:\n{functions.roll(text.replace('+', ' ').split())}"
 
 
+@default_handler(
+    require_input=True,
+    examples=["3d6+2d4 >= 14", "d20 = 20", "100d6"],
+    blocking=True,
+)
+def odds(text, **kwargs):
+    return functions.odds(text)
+
+
 @default_handler(
     command_override="tr",
     require_input=True,
@@ -298,6 +482,12 @@ def ask_8ball(text, **kwargs):
     return functions.ask_8ball()
 
 
+@image_handler(command_override="ascii")
+def ascii_art(data, **kwargs):
+    limit = constants.MSG_MAX_CHARACTERS - len("```\n```")
+    return f"```\n{functions.image_to_ascii(data, limit=limit)}```"
+
+
 @default_handler(require_input=True, examples=["neon"])
 def wiki(text, **kwargs):
     try:
@@ -316,7 +506,7 @@ def urban(text, **kwargs):
 
 @default_handler(reply=True, require_input=True)
 def doc(text, **kwargs):
-    return functions.doc(text)
+    return functions.doc(text, owner_id=kwargs["message_author"])
 
 
 @default_handler(reply=True, require_input=True, examples=["bcgfycrfz byrdbpbwbz"])
@@ -334,7 +524,7 @@ def reverse(text, **kwargs):
     return text[::-1]
 
 
-@default_handler(admin=True, command_override="r")
+@default_handler(admin=True, command_override="r", examples=["", "proc"])
 def resource_usage(text, **kwargs):
     return functions.resource_usage(text)
 
@@ -366,6 +556,10 @@ def gpt_manage(text, **kwargs):
     Commands:
         - show_role <owner>
         - set_role <owner> <text>
+        - get_model <owner>
+        - set_model <owner> <model|auto>
+        - latency
+        - usage [days]
     """
 
     match = re.search(r"^(?P<command>\w+)\s?(?P<arg1>\w+)?\s?(?P<body>.*)?$", text)
@@ -380,6 +574,17 @@ def gpt_manage(text, **kwargs):
             case "set_role":
                 Completion().set_role(arg1, body)
                 return "Done"
+            case "get_model":
+                return Completion().get_model_override(arg1) or "auto"
+            case "set_model":
+                model = None if body.strip() == "auto" else body.strip()
+                Completion().set_model_override(arg1, model)
+                return "Done"
+            case "latency":
+                return f"```\n{GPT_METRICS.latency_summary()}\n```"
+            case "usage":
+                days = int(arg1) if arg1 else 1
+                return f"```\n{GPT_METRICS.usage_summary(days=days)}\n```"
             case _:
                 return f"Unknown command provided: {command}"
     except Exception as e:
@@ -402,12 +607,12 @@ def gpt_manage(text, **kwargs):
 #     ]
 
 
-@direct_message_handler(reply=True)
+@direct_message_handler(reply=True, stream=True)
 def direct_chat(text, **kwargs):
-    return Completion().request(
+    return Completion().astream(
         text,
         owner_id=kwargs["message_author"],
         use_history=True,
-        history_limit=3,
         handle_intents=True,
+        on_queued=kwargs.get("on_queued"),
     )
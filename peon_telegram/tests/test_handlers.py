@@ -0,0 +1,99 @@
+"""Handler test cases."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import peon_telegram.handlers as handlers
+from telegram.error import RetryAfter
+
+
+class FakeMessage:
+    def __init__(self, text, rate_limited=0):
+        self.text = text
+        self.edits = []
+        self.rate_limited = rate_limited
+        """Amount of final (markdown) edits failing with `RetryAfter`."""
+
+    async def edit_text(self, text, **kwargs):
+        if kwargs.get("parse_mode") and self.rate_limited:
+            self.rate_limited -= 1
+            raise RetryAfter(0)
+        self.edits.append(text)
+        self.text = text
+
+
+def direct_chat():
+    return next(
+        handler.callback
+        for handler in handlers.HANDLERS
+        if handler.callback.__name__ == "direct_chat"
+    )
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_streamed_direct_message(queued):
+    sent = []
+    requests = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append(FakeMessage(text))
+        return sent[-1]
+
+    async def astream(text, owner_id, on_queued, **kwargs):
+        requests.append((text, owner_id))
+        if queued:
+            await on_queued()
+        for chunk in ["work ", "work_", "x" * 4000]:
+            yield chunk
+
+    user = SimpleNamespace(id=42, name="peon")
+    update = SimpleNamespace(
+        message=SimpleNamespace(text=" zug zug ", id=1, from_user=user),
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=42),
+    )
+    context = SimpleNamespace(bot=SimpleNamespace(send_message=send_message))
+
+    with mock.patch.object(handlers, "Completion") as completion:
+        completion.return_value.astream = astream
+        asyncio.run(direct_chat()(update, context))
+
+    assert requests == [("zug zug", "42")]
+    placeholder, rest = sent
+    assert placeholder.edits[: 1 + queued] == [handlers.STREAM_QUEUED] * queued + [
+        "work "
+    ]
+    assert placeholder.text == "work work\\_" + "x" * 3990
+    assert rest.text == "x" * 10
+
+
+@pytest.mark.parametrize("rate_limited", [2, handlers.STREAM_FINAL_EDIT_ATTEMPTS])
+def test_streamed_final_edit_rate_limited(rate_limited):
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append(FakeMessage(text, rate_limited if not sent else 0))
+        return sent[-1]
+
+    def stream(on_queued):
+        async def chunks():
+            yield "zug_zug"
+
+        return chunks()
+
+    update = SimpleNamespace(
+        message=SimpleNamespace(id=1), effective_chat=SimpleNamespace(id=42)
+    )
+    context = SimpleNamespace(bot=SimpleNamespace(send_message=send_message))
+    asyncio.run(handlers.stream_reply(update, context, stream))
+
+    if rate_limited < handlers.STREAM_FINAL_EDIT_ATTEMPTS:
+        placeholder, = sent
+    else:
+        placeholder, final = sent
+        assert final.text == "zug\\_zug"
+        assert placeholder.text == "zug_zug"
+    assert sent[-1].text == "zug\\_zug"